@@ -3,26 +3,73 @@ import webbrowser
 import re
 import json
 import os
+import time
+from urllib.parse import quote_plus
+
+# when we started, for the startup timing report
+STARTED_AT = time.perf_counter()
+
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
     QGroupBox, QLabel, QLineEdit, QComboBox, QTextEdit,
-    QPushButton, QTabWidget, QListWidget, QMessageBox, QScrollArea,
-    QTreeWidget, QTreeWidgetItem, QHeaderView, QStatusBar, QMainWindow,
-    QMenu, QTreeWidgetItemIterator, QFileDialog
+    QPushButton, QTabWidget, QMessageBox, QScrollArea,
+    QTreeView, QHeaderView, QStatusBar, QMainWindow,
+    QMenu, QFileDialog, QListView, QProgressDialog
 )
-from PyQt6.QtCore import Qt, QTimer
+from PyQt6.QtCore import Qt, QTimer, QFileSystemWatcher
 from PyQt6.QtGui import QAction
 
+import dork_compiler
+import history_store
+from history_store import HistoryStore, add_dorks
+from history_search import HistoryIndex
+from history_groups import HistoryGroups
+from history_views import HistoryListModel, HistoryTreeModel, HistoryLoader, HistoryExporter, DorkImporter
+from dork_profiler import PROFILER
+
 class GoogleDorkApp(QMainWindow):
     """
     a desktop app for making google dork queries, using pyqt6
     """
-    # where we save the history
-    HISTORY_FILE = "history.json"
+    # where we save the history ($GDORK_HISTORY wins if it's set)
+    HISTORY_FILE = history_store.DEFAULT_HISTORY_FILE
+    # the old whole-list history file, brought over the first time we run
+    OLD_HISTORY_FILE = history_store.OLD_HISTORY_FILE
+    # how long to wait after the last keystroke before searching the history
+    SEARCH_DELAY_MS = 150
+    # bunches up preview updates that land within about one frame
+    PREVIEW_DELAY_MS = 16
+    # waits for other windows to finish a burst of saves before merging them in
+    MERGE_DELAY_MS = 200
+    # with GDORK_PROFILE set, a heartbeat this often spots the event loop
+    # getting stuck, anything this much late counts as a stall
+    HEARTBEAT_MS = 50
+    STALL_MS = 100
 
     def __init__(self):
         super().__init__()
+        # name -> ms since STARTED_AT, for the startup report
+        self.startup_times = {}
+        # history is read in the background, and the list only gets filled
+        # once it's loaded and the history tab has been opened
+        self.history_ready = False
+        self.history_rows_made = False
+        self.history = HistoryStore(history_store.history_path(self.HISTORY_FILE),
+                                    legacy_path=self.OLD_HISTORY_FILE)
+        self.history_index = HistoryIndex(self.history)
+        self.history.add_listener(self.history_index.on_change)
+        self.history_groups = HistoryGroups(self.history)
+        self.history.add_listener(self.history_groups.on_change)
+        # buttons that need the whole history, they stay off until it's loaded
+        # instead of freezing the window waiting for it
+        self.history_buttons = []
         self.setup_the_window()
+        for button in self.history_buttons:
+            button.setEnabled(False)
+            button.setToolTip("Waiting for the history to load...")
+        self.mark_startup("window built")
+        if PROFILER.enabled:
+            self.start_profiling()
         self.load_history()
 
     def setup_the_window(self):
@@ -46,6 +93,8 @@ class GoogleDorkApp(QMainWindow):
 
         self.tabs.addTab(builder_tab, "Query Builder")
         self.tabs.addTab(history_tab, "Query History")
+        self.history_tab = history_tab
+        self.tabs.currentChanged.connect(self.tab_changed)
 
         # a place to keep all our input boxes
         self.widgets = {}
@@ -59,12 +108,20 @@ class GoogleDorkApp(QMainWindow):
         self.setStatusBar(self.statusBar)
         self.statusBar.showMessage("Ready", 3000)
 
+        # the compiled bit of each box, so typing in one box only redoes that one
+        self.query_fragments = dork_compiler.QueryFragments(tuple(self.widgets))
+        self.changed_fields = set(self.widgets)
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(self.PREVIEW_DELAY_MS)
+        self.preview_timer.timeout.connect(self.update_preview)
+
         # connect the input boxes so they update the preview automatically
-        for widget in self.widgets.values():
+        for key, widget in self.widgets.items():
             if isinstance(widget, QLineEdit):
-                widget.textChanged.connect(self.update_preview)
+                widget.textChanged.connect(lambda text, key=key: self.field_changed(key))
             elif isinstance(widget, QComboBox):
-                widget.currentTextChanged.connect(self.update_preview)
+                widget.currentTextChanged.connect(lambda text, key=key: self.field_changed(key))
 
         self.update_preview()
         self.make_it_look_nice()
@@ -135,15 +192,41 @@ class GoogleDorkApp(QMainWindow):
         layout.addWidget(history_box)
 
         left_side = QVBoxLayout()
-        search_bar = QLineEdit()
-        search_bar.setPlaceholderText("Search history...")
-        search_bar.textChanged.connect(self.filter_history)
-        left_side.addWidget(search_bar)
-
-        self.history_listbox = QListWidget()
-        self.history_listbox.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.history_listbox.customContextMenuRequested.connect(self.right_click_history_menu)
-        left_side.addWidget(self.history_listbox)
+        self.history_search_bar = QLineEdit()
+        self.history_search_bar.setPlaceholderText("Search history... (site:example.com, filetype:pdf also work)")
+        left_side.addWidget(self.history_search_bar)
+
+        # wait until typing stops for a moment before searching
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(lambda: self.filter_history(self.history_search_bar.text()))
+        self.history_search_bar.textChanged.connect(self.search_timer.start)
+
+        # a model/view list only draws the rows you can see
+        self.history_model = HistoryListModel(self.history, self)
+        self.history_view = QListView()
+        self.history_view.setModel(self.history_model)
+        self.history_view.setUniformItemSizes(True)
+        self.history_view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.history_view.customContextMenuRequested.connect(
+            lambda position: self.right_click_history_menu(self.history_view, position))
+
+        # the same history grouped by site, groups only get filled in when opened
+        self.history_tree_model = HistoryTreeModel(self.history_groups, self)
+        self.history_tree = QTreeView()
+        self.history_tree.setModel(self.history_tree_model)
+        self.history_tree.setHeaderHidden(True)
+        self.history_tree.setUniformRowHeights(True)
+        self.history_tree.setSelectionMode(QTreeView.SelectionMode.ExtendedSelection)
+        self.history_tree.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.history_tree.customContextMenuRequested.connect(
+            lambda position: self.right_click_history_menu(self.history_tree, position))
+
+        self.history_pages = QTabWidget()
+        self.history_pages.addTab(self.history_view, "All")
+        self.history_pages.addTab(self.history_tree, "By Site")
+        left_side.addWidget(self.history_pages)
         history_box_layout.addLayout(left_side, 1)
 
         right_side_buttons = QVBoxLayout()
@@ -157,9 +240,15 @@ class GoogleDorkApp(QMainWindow):
         btn_delete.clicked.connect(self.delete_from_history)
         right_side_buttons.addWidget(btn_delete)
 
-        btn_export = QPushButton(" Export to TXT")
-        btn_export.clicked.connect(self.save_history_as_txt)
+        btn_export = QPushButton(" Export...")
+        btn_export.clicked.connect(self.export_the_history)
         right_side_buttons.addWidget(btn_export)
+        self.history_buttons.append(btn_export)
+
+        btn_import = QPushButton(" Import Dorks")
+        btn_import.clicked.connect(self.import_dorks_from_file)
+        right_side_buttons.addWidget(btn_import)
+        self.history_buttons.append(btn_import)
 
         right_side_buttons.addStretch()
 
@@ -189,73 +278,55 @@ class GoogleDorkApp(QMainWindow):
         buttons_layout.addWidget(btn_search)
         btn_save = QPushButton("Save to History")
         btn_save.clicked.connect(self.save_to_history)
+        buttons_layout.addWidget(btn_save)
+        self.history_buttons.append(btn_save)
         parent_layout.addLayout(buttons_layout)
 
     def handle_or_and_quotes(self, text, operator=""):
         """handles the comma for 'OR' and adds quotes"""
-        if not text:
-            return ""
-        
-        bits = [part.strip() for part in text.split(',')]
-        finished_bits = []
-        for part in bits:
-            # if there's a space, it needs quotes
-            if ' ' in part and not (part.startswith('"') and part.endswith('"')):
-                part = f'"{part}"'
-            
-            if operator:
-                finished_bits.append(f"{operator}:{part}")
-            else:
-                finished_bits.append(part)
-        
-        # if there are multiple parts, wrap them in ( ... OR ... )
-        if len(finished_bits) > 1:
-            return f"({ ' OR '.join(finished_bits) })"
-        return finished_bits[0]
+        return dork_compiler.handle_or_and_quotes(text, operator)
 
     def put_the_query_together(self, parts):
         """builds the final query string from all the pieces"""
-        all_the_parts = []
-        
-        if parts.get("keywords"):
-            all_the_parts.append(self.handle_or_and_quotes(parts["keywords"]))
-
-        for key, value in parts.items():
-            if key in ["keywords", "exclude_keywords"] or not value:
-                continue
-            operator = key.replace('_', '')
-            all_the_parts.append(self.handle_or_and_quotes(value, operator))
-
-        if parts.get("exclude_keywords"):
-            excluded_words = [part.strip() for part in parts["exclude_keywords"].split(',')]
-            for word in excluded_words:
-                if ' ' in word:
-                    all_the_parts.append(f'-\"{word}\"')
-                else:
-                    all_the_parts.append(f'-{word}')
+        return dork_compiler.put_the_query_together(parts)
 
-        return " ".join(filter(None, all_the_parts))
+    def field_changed(self, key):
+        """remembers which box changed and updates the preview a moment later"""
+        self.changed_fields.add(key)
+        self.preview_timer.start()
 
+    @PROFILER.timed("update_preview")
     def update_preview(self, *args):
-        """updates the preview box whenever you type something"""
-        parts = self.get_all_user_input()
-        the_final_query = self.put_the_query_together(parts)
-        self.preview_text.setText(the_final_query)
+        """updates the preview box with whatever boxes changed since last time"""
+        self.preview_timer.stop()
+        anything_new = False
+        for key in self.changed_fields:
+            if self.query_fragments.update(key, self.get_one_user_input(key)):
+                anything_new = True
+        self.changed_fields.clear()
+        if anything_new:
+            self.preview_text.setPlainText(self.query_fragments.query())
     
+    def get_one_user_input(self, key):
+        """gets the text from one input box"""
+        widget = self.widgets[key]
+        if isinstance(widget, QLineEdit):
+            return widget.text().strip()
+        elif isinstance(widget, QComboBox):
+            return widget.currentText()
+        return ""
+
+    @PROFILER.timed("get_all_user_input")
     def get_all_user_input(self):
         """gets all the text from the input boxes"""
         all_the_text = {}
-        for key, widget in self.widgets.items():
-            value = ""
-            if isinstance(widget, QLineEdit):
-                value = widget.text().strip()
-            elif isinstance(widget, QComboBox):
-                value = widget.currentText()
-            all_the_text[key] = value
+        for key in self.widgets:
+            all_the_text[key] = self.get_one_user_input(key)
         return all_the_text
 
     def copy_to_clipboard(self):
         """copies the query to the clipboard"""
+        self.update_preview()
         query = self.preview_text.toPlainText().strip()
         if query:
             QApplication.clipboard().setText(query)
@@ -265,9 +336,10 @@ class GoogleDorkApp(QMainWindow):
 
     def search_in_browser(self):
         """opens the query in your web browser"""
+        self.update_preview()
         query = self.preview_text.toPlainText().strip()
         if query:
-            url = f"https://www.google.com/search?q={query}"
+            url = f"https://www.google.com/search?q={quote_plus(query)}"
             webbrowser.open(url)
             self.statusBar.showMessage(f"Searching for: {query}", 3000)
         else:
@@ -291,66 +363,199 @@ class GoogleDorkApp(QMainWindow):
             QMessageBox.warning(self, "Warning", "Cannot save an empty query.")
             return
         # check if it's already saved
-        for i in range(self.history_listbox.count()):
-            item = self.history_listbox.item(i)
-            if item.text() == query_string:
-                QMessageBox.information(self, "Info", "This query is already in your history.")
-                return
-        item = QListWidgetItem(query_string)
-        item.setData(Qt.ItemDataRole.UserRole, query_parts)
-        self.history_listbox.addItem(item)
-        self.save_history()
+        if not self.history_ready:
+            return
+        if self.history.find(query_string) is not None:
+            QMessageBox.information(self, "Info", "This query is already in your history.")
+            return
+        entry_id = self.save_history(query_string, query_parts)
+        if entry_id is None:
+            return
+        self.add_history_row(entry_id)
         self.statusBar.showMessage("Query saved to history.", 3000)
 
+    def selected_history_ids(self):
+        """the entry ids of whatever is selected in the history list or tree"""
+        view = self.history_pages.currentWidget()
+        indexes = view.selectionModel().selectedIndexes()
+        ids = [view.model().entry_id(index) for index in indexes]
+        # group rows in the tree don't have an id
+        return [entry_id for entry_id in ids if entry_id is not None]
+
     def load_from_history(self):
         """loads a selected query from the history list"""
-        selected_items = self.history_listbox.selectedItems()
-        if not selected_items:
+        selected_ids = self.selected_history_ids()
+        if not selected_ids:
             QMessageBox.warning(self, "Warning", "Please select a query from the history to load.")
             return
         
         # if you select a bunch of things, just load the first one
-        self.load_one_history_item(selected_items[0])
+        self.load_one_history_item(selected_ids[0])
 
     def delete_from_history(self):
         """deletes the selected query from the history list"""
-        selected_items = self.history_listbox.selectedItems()
-        if not selected_items:
+        selected_ids = self.selected_history_ids()
+        if not selected_ids:
             QMessageBox.warning(self, "Warning", "Please select a query to delete.")
             return
-        for item in selected_items:
-            self.history_listbox.takeItem(self.history_listbox.row(item))
-        self.save_history()
-        self.statusBar.showMessage(f"Deleted {len(selected_items)} item(s) from history.", 3000)
-
-    def save_history(self):
-        """saves the whole history list to a json file"""
-        stuff_to_save = []
-        for i in range(self.history_listbox.count()):
-            item = self.history_listbox.item(i)
-            stuff_to_save.append({
-                "display_text": item.text(),
-                "query_parts": item.data(Qt.ItemDataRole.UserRole)
-            })
+        # the rows only go once the delete is safely in the journal
+        if not self.forget_history(selected_ids):
+            return
+        self.history_model.remove_ids(selected_ids)
+        self.history_tree_model.refresh()
+        self.statusBar.showMessage(f"Deleted {len(selected_ids)} item(s) from history.", 3000)
+
+    @PROFILER.timed("save_history")
+    def save_history(self, display_text, query_parts):
+        """adds one query to the history file, gives back its id (or None if it failed)"""
         try:
-            with open(self.HISTORY_FILE, "w") as f:
-                json.dump(stuff_to_save, f, indent=4)
-        except IOError as e:
+            return self.history.add(display_text, query_parts)
+        except (IOError, OSError) as e:
+            QMessageBox.critical(self, "Error", f"Could not save history file: {e}")
+            return None
+
+    def forget_history(self, entry_ids):
+        """records that some queries got deleted from the history, gives back False if that failed"""
+        try:
+            self.history.delete(entry_ids)
+        except (IOError, OSError) as e:
             QMessageBox.critical(self, "Error", f"Could not save history file: {e}")
+            return False
+        return True
+
+    def add_history_row(self, entry_id):
+        """puts one history entry in the list, if it fits the current search"""
+        if self.history_rows_made and self.history_index.matches(self.history_search_bar.text(), entry_id):
+            self.history_model.append_id(entry_id)
+        self.history_tree_model.refresh()
 
     def load_history(self):
-        """loads the history from the json file when the app starts"""
-        if not os.path.exists(self.HISTORY_FILE):
+        """starts reading the history journal in the background"""
+        self.statusBar.showMessage("Loading history...")
+        self.history_load_started = time.perf_counter()
+        self.history_loader = HistoryLoader(self.history, self)
+        self.history_loader.progress.connect(
+            lambda count: self.statusBar.showMessage(f"Loading history... {count} queries so far"))
+        self.history_loader.failed.connect(
+            lambda error: QMessageBox.critical(self, "Error", f"Could not load history file: {error}"))
+        self.history_loader.finished.connect(self.history_loaded)
+        self.history_loader.start()
+
+    def wait_for_history(self):
+        """
+        blocks until the history is read in. only for scripts and benchmarks,
+        the buttons that need the history just stay off until it's loaded
+        """
+        if not self.history_ready:
+            self.history_loader.wait()
+            self.history_loaded()
+
+    def history_loaded(self):
+        """runs once the background loader is done"""
+        if self.history_ready:
+            return
+        self.history_ready = True
+        for button in self.history_buttons:
+            button.setEnabled(True)
+            button.setToolTip("")
+        self.history_tree_model.reset()
+        self.mark_startup("history loaded")
+        if PROFILER.enabled:
+            PROFILER.record("load_history", time.perf_counter() - self.history_load_started)
+        if self.history_rows_made:
+            self.filter_history(self.history_search_bar.text())
+        self.statusBar.showMessage(f"Loaded {len(self.history)} saved queries.", 3000)
+        self.watch_history_file()
+        self.report_startup()
+
+    def watch_history_file(self):
+        """keeps an eye on the history file so saves from other windows show up here"""
+        self.merge_timer = QTimer(self)
+        self.merge_timer.setSingleShot(True)
+        self.merge_timer.setInterval(self.MERGE_DELAY_MS)
+        self.merge_timer.timeout.connect(self.merge_history_changes)
+        self.history_watcher = QFileSystemWatcher([self.history.path], self)
+        self.history_watcher.fileChanged.connect(self.merge_timer.start)
+        # anything saved between loading and watching
+        self.merge_history_changes()
+
+    def merge_history_changes(self):
+        """adds and removes just the rows other windows or cli jobs changed"""
+        # compacting swaps in a new file, which the watcher forgets about
+        if self.history.path not in self.history_watcher.files() and os.path.exists(self.history.path):
+            self.history_watcher.addPath(self.history.path)
+        try:
+            changes = self.history.sync()
+        except (IOError, OSError) as e:
+            self.statusBar.showMessage(f"Could not read history changes: {e}", 5000)
+            return
+        if not changes:
+            return
+        deleted = [entry_id for action, entry_id in changes if action == "del"]
+        for action, entry_id in changes:
+            if action == "add":
+                self.add_history_row(entry_id)
+        if deleted:
+            self.history_model.remove_ids(deleted)
+        self.history_tree_model.refresh()
+        self.statusBar.showMessage(f"Picked up {len(changes)} history change(s) from elsewhere.", 3000)
+
+    def tab_changed(self, index):
+        """fills the history list the first time the history tab gets opened"""
+        if self.tabs.widget(index) is self.history_tab and not self.history_rows_made:
+            self.history_rows_made = True
+            self.filter_history(self.history_search_bar.text())
+            self.mark_startup("history rows made")
+
+    def start_profiling(self):
+        """a heartbeat to catch event loop stalls, and a live summary in the status bar"""
+        self.profile_label = QLabel()
+        self.statusBar.addPermanentWidget(self.profile_label)
+        self.heartbeats = 0
+        self.last_heartbeat = time.perf_counter()
+        self.heartbeat_timer = QTimer(self)
+        self.heartbeat_timer.setInterval(self.HEARTBEAT_MS)
+        self.heartbeat_timer.timeout.connect(self.heartbeat)
+        self.heartbeat_timer.start()
+
+    def heartbeat(self):
+        """if this runs late, something held up the event loop for that long"""
+        now = time.perf_counter()
+        late = now - self.last_heartbeat - self.HEARTBEAT_MS / 1000
+        self.last_heartbeat = now
+        if late * 1000 >= self.STALL_MS:
+            PROFILER.record_stall(late)
+        self.heartbeats += 1
+        # about once a second update the summary, every ten save the stats
+        if self.heartbeats % 20 == 0:
+            self.profile_label.setText(PROFILER.short_summary(
+                ("update_preview", "filter_history", "save_history")))
+        if self.heartbeats % 200 == 0:
+            PROFILER.checkpoint()
+
+    def mark_startup(self, name):
+        """notes how long after starting something happened"""
+        if name not in self.startup_times:
+            self.startup_times[name] = (time.perf_counter() - STARTED_AT) * 1000
+
+    def report_startup(self):
+        """
+        writes the startup times out if GDORK_STARTUP_REPORT is set. "1" or "-"
+        prints them, anything else is a file we add one json line to.
+        """
+        where = os.environ.get("GDORK_STARTUP_REPORT")
+        if not where:
             return
+        if where in ("1", "-"):
+            times = ", ".join(f"{name} {ms:.1f}ms" for name, ms in self.startup_times.items())
+            print(f"startup: {times} ({len(self.history)} history entries)", file=sys.stderr)
+            return
+        report = dict(self.startup_times, history_entries=len(self.history))
         try:
-            with open(self.HISTORY_FILE, "r") as f:
-                stuff_from_file = json.load(f)
-            for entry in stuff_from_file:
-                item = QListWidgetItem(entry["display_text"])
-                item.setData(Qt.ItemDataRole.UserRole, entry["query_parts"])
-                self.history_listbox.addItem(item)
-        except (IOError, json.JSONDecodeError) as e:
-            QMessageBox.critical(self, "Error", f"Could not load history file: {e}")
+            with open(where, "a") as f:
+                f.write(json.dumps(report) + "\n")
+        except IOError as e:
+            print(f"could not write startup report: {e}", file=sys.stderr)
 
     def fill_in_the_boxes(self, saved_parts):
         """fills in the input boxes from a saved query"""
@@ -366,55 +571,169 @@ class GoogleDorkApp(QMainWindow):
                         widget.setCurrentIndex(index)
         self.update_preview()
 
+    @PROFILER.timed("filter_history")
     def filter_history(self, search_text):
-        """filters the history list as you type in the search bar"""
-        for i in range(self.history_listbox.count()):
-            item = self.history_listbox.item(i)
-            item.setHidden(search_text.lower() not in item.text().lower())
-
-    def right_click_history_menu(self, position):
-        """the right-click menu for the history list"""
-        item = self.history_listbox.itemAt(position)
-        if not item: return
+        """shows just the history entries that match the search bar"""
+        if not (self.history_ready and self.history_rows_made):
+            return
+        self.history_model.set_ids(self.history_index.search(search_text))
+
+    def right_click_history_menu(self, view, position):
+        """the right-click menu for the history list and tree"""
+        index = view.indexAt(position)
+        if not index.isValid(): return
+        entry_id = view.model().entry_id(index)
+        if entry_id is None: return
         
         menu = QMenu()
         load_action = QAction("Load Query", self)
-        load_action.triggered.connect(lambda: self.load_one_history_item(item))
+        load_action.triggered.connect(lambda: self.load_one_history_item(entry_id))
         delete_action = QAction("Delete Query", self)
-        delete_action.triggered.connect(lambda: self.delete_one_history_item(item))
+        delete_action.triggered.connect(lambda: self.delete_one_history_item(entry_id))
         
         menu.addAction(load_action)
         menu.addAction(delete_action)
-        menu.exec(self.history_listbox.mapToGlobal(position))
+        menu.exec(view.mapToGlobal(position))
         
-    def load_one_history_item(self, the_item):
-        """loads a specific item from the history list"""
-        query_parts = the_item.data(Qt.ItemDataRole.UserRole)
-        self.fill_in_the_boxes(query_parts)
+    def load_one_history_item(self, entry_id):
+        """loads a specific entry from the history"""
+        entry = self.history.get(entry_id)
+        if entry is None:
+            return
+        self.fill_in_the_boxes(entry["query_parts"])
+        display_text = entry["display_text"]
+        if self.put_the_query_together(self.get_all_user_input()) != display_text:
+            # imported dorks the boxes can't say exactly (brackets, OR between
+            # fields, a filetype the list doesn't have) are kept as written, so
+            # show that instead of the boxes' take on it. it stays until a box
+            # gets changed
+            self.preview_text.setPlainText(display_text)
+            self.statusBar.showMessage("Loaded query as it was saved, the boxes only hold part of it."
+                                       " Changing a box rebuilds the query from the boxes.", 8000)
+            return
         self.statusBar.showMessage("Loaded query from history.", 3000)
 
-    def delete_one_history_item(self, the_item):
-        """deletes a specific item from the history list"""
-        self.history_listbox.takeItem(self.history_listbox.row(the_item))
-        self.save_history()
+    def delete_one_history_item(self, entry_id):
+        """deletes a specific entry from the history"""
+        if not self.forget_history([entry_id]):
+            return
+        self.history_model.remove_ids([entry_id])
+        self.history_tree_model.refresh()
         self.statusBar.showMessage("Deleted query from history.", 3000)
 
-    def save_history_as_txt(self):
-        """saves the history list to a plain text file"""
-        if self.history_listbox.count() == 0:
-            QMessageBox.warning(self, "Warning", "History is empty. Nothing to export.")
+    def import_dorks_from_file(self):
+        """reads a text file of raw dorks (one per line) into the history, in the background"""
+        file_path, _ = QFileDialog.getOpenFileName(self, "Import Dorks", "", "Text Files (*.txt);;All Files (*)")
+        if not file_path or not self.history_ready:
             return
 
-        file_path, _ = QFileDialog.getSaveFileName(self, "Save History As", "dork_history.txt", "Text Files (*.txt)")
+        progress_box = QProgressDialog("Importing dorks...", "Cancel", 0, 100, self)
+        progress_box.setWindowModality(Qt.WindowModality.WindowModal)
+        progress_box.setMinimumDuration(500)
+        importer = DorkImporter(file_path, self)
+        importer.progress.connect(progress_box.setValue)
+        progress_box.canceled.connect(importer.cancel)
+        # the worker only reads and parses, the saving happens here a batch at a time
+        counts = {"added": 0, "skipped": 0}
+
+        def save_batch(batch):
+            added, skipped = add_dorks(self.history, batch)
+            counts["added"] += added
+            counts["skipped"] += skipped
+            # let the window catch up on everything else before the next batch comes
+            QTimer.singleShot(0, importer.batch_saved)
+
+        def show_what_was_added():
+            self.filter_history(self.history_search_bar.text())
+            self.history_tree_model.refresh()
+
+        def finished_ok(unparseable):
+            progress_box.reset()
+            show_what_was_added()
+            self.statusBar.showMessage(f"Imported {counts['added']} dork(s), skipped {counts['skipped']}"
+                                       f" duplicate(s) and {unparseable} unparseable line(s).", 5000)
+
+        def finished_badly(message):
+            progress_box.reset()
+            show_what_was_added()
+            QMessageBox.critical(self, "Error", message)
+
+        def stopped():
+            progress_box.reset()
+            show_what_was_added()
+            self.statusBar.showMessage(f"Import cancelled, {counts['added']} dork(s) were already added.", 5000)
+
+        importer.parsed.connect(save_batch)
+        importer.done.connect(finished_ok)
+        importer.failed.connect(finished_badly)
+        importer.cancelled.connect(stopped)
+        self.dork_importer = importer
+        importer.start()
+
+    def export_the_history(self):
+        """exports the history in the background, as txt, jsonl or csv (maybe compressed)"""
+        if not self.history_ready:
+            return
+        if len(self.history) == 0:
+            QMessageBox.warning(self, "Warning", "History is empty. Nothing to export.")
+            return
 
-        if file_path:
-            try:
-                with open(file_path, 'w') as f:
-                    for i in range(self.history_listbox.count()):
-                        f.write(self.history_listbox.item(i).text() + '\n')
-                self.statusBar.showMessage(f"History successfully exported to {file_path}", 5000)
-            except IOError as e:
-                QMessageBox.critical(self, "Error", f"Could not save file: {e}")
+        filters = {
+            "Text Files (*.txt)": ".txt",
+            "JSON Lines with query parts (*.jsonl)": ".jsonl",
+            "CSV Files (*.csv)": ".csv",
+            "Gzipped (*.txt.gz *.jsonl.gz *.csv.gz)": ".txt.gz",
+            "Zstandard (*.txt.zst *.jsonl.zst *.csv.zst)": ".txt.zst",
+        }
+        file_path, chosen = QFileDialog.getSaveFileName(
+            self, "Save History As", "dork_history.txt", ";;".join(filters))
+        if not file_path:
+            return
+        if not any(file_path.lower().endswith(end) for end in (".txt", ".jsonl", ".csv", ".gz", ".zst")):
+            file_path += filters.get(chosen, ".txt")
+
+        progress_box = QProgressDialog("Exporting history...", "Cancel", 0, len(self.history), self)
+        progress_box.setWindowModality(Qt.WindowModality.WindowModal)
+        progress_box.setMinimumDuration(500)
+        exporter = HistoryExporter(self.history, file_path, self)
+        exporter.progress.connect(lambda done, total: progress_box.setValue(done))
+        progress_box.canceled.connect(exporter.cancel)
+
+        def finished_ok(count):
+            progress_box.reset()
+            self.statusBar.showMessage(f"Exported {count} queries to {file_path}", 5000)
+
+        def finished_badly(message):
+            progress_box.reset()
+            QMessageBox.critical(self, "Error", message)
+
+        def stopped():
+            progress_box.reset()
+            self.statusBar.showMessage("Export cancelled.", 5000)
+
+        exporter.done.connect(finished_ok)
+        exporter.failed.connect(finished_badly)
+        exporter.cancelled.connect(stopped)
+        self.history_exporter = exporter
+        exporter.start()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.mark_startup("window shown")
+
+    def closeEvent(self, event):
+        """makes sure the history file is closed properly when the app shuts"""
+        self.history_loader.wait()
+        if hasattr(self, "merge_timer"):
+            self.merge_timer.stop()
+        if hasattr(self, "heartbeat_timer"):
+            self.heartbeat_timer.stop()
+        for worker in (getattr(self, "history_exporter", None), getattr(self, "dork_importer", None)):
+            if worker is not None:
+                worker.cancel()
+                worker.wait()
+        self.history.close()
+        super().closeEvent(event)
 
     def make_it_look_nice(self):
         """applies a clean, light style to the app"""
@@ -454,7 +773,7 @@ class GoogleDorkApp(QMainWindow):
                 left: 10px;
                 padding: 0 5px 0 5px;
             }
-            QLineEdit, QComboBox, QTextEdit, QListWidget, QTreeWidget {
+            QLineEdit, QComboBox, QTextEdit, QListView, QTreeView {
                 background-color: #fff;
                 border: 1px solid #ccc;
                 padding: 5px;
@@ -482,8 +801,12 @@ class GoogleDorkApp(QMainWindow):
             }
         """)
 
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
+def main(argv=None):
+    """starts the gui"""
+    app = QApplication(sys.argv if argv is None else argv)
     ex = GoogleDorkApp()
     ex.show()
-    sys.exit(app.exec())
+    return app.exec()
+
+if __name__ == "__main__":
+    sys.exit(main())
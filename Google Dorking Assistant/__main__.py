@@ -0,0 +1,6 @@
+"""lets you run the whole folder: python "Google Dorking Assistant" compile --site example.com"""
+import sys
+
+from dork_cli import main
+
+sys.exit(main())
@@ -0,0 +1,420 @@
+"""
+benchmarks for the hot paths, so we can tell when something got slower.
+
+    python bench_dorks.py --out results.json
+    python bench_dorks.py --out new.json --compare results.json --tolerance 0.2
+    python bench_dorks.py --sizes 1000,100000,1000000 --skip-gui
+
+the memory.* numbers are bytes per history entry: the store, index and
+groups from tracemalloc, and the whole app against the old QListWidget
+history from the size of the process.
+every number goes into one flat json dict. names ending in _per_sec are
+better when they go up, everything else (seconds, ms) is better going down.
+--compare exits with 1 if anything got worse by more than --tolerance.
+the gui bits run on qt's offscreen platform and get skipped if pyqt6 isn't there.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import dork_compiler
+from dork_compiler import FIELD_ORDER, put_the_query_together
+from history_groups import HistoryGroups
+from history_search import HistoryIndex
+from history_store import HistoryStore
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+OR_SIZES = (1, 10, 100, 1000)
+HISTORY_SIZES = (1000, 100000, 1000000)
+# tracemalloc makes everything a lot slower and the plain dicts get big, so
+# the memory numbers only get measured up to this size (they're per entry anyway)
+MEMORY_MAX_SIZE = 200000
+FILETYPES = ("pdf", "docx", "xlsx", "txt", "log", "php", "sql", "env", "conf", "bak")
+WORDS = ("admin", "login", "index of", "password", "backup", "config", "secret",
+         "internal report", "dashboard", "upload")
+
+
+def make_parts(rng, number):
+    """a made up but realistic looking query_parts dict"""
+    parts = dict.fromkeys(FIELD_ORDER, "")
+    parts["site"] = f"target{number % 5000}.example.com"
+    parts["in_title"] = ", ".join(rng.sample(WORDS, rng.randint(1, 3)))
+    if number % 3 == 0:
+        parts["in_url"] = f"{rng.choice(WORDS).replace(' ', '')}{number}.php"
+    if number % 2 == 0:
+        parts["filetype"] = rng.choice(FILETYPES)
+    if number % 7 == 0:
+        parts["exclude_keywords"] = "sample, public template"
+    return parts
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - started, result
+
+
+def bench_compile(results):
+    """compile throughput for different sized OR lists, with the caches cleared"""
+    for size in OR_SIZES:
+        rounds = max(20, 20000 // size)
+        texts = [", ".join(f"term{round_number}x{i} word" for i in range(size))
+                 for round_number in range(rounds)]
+        dork_compiler._or_group.cache_clear()
+        seconds, _ = timed(lambda: [dork_compiler.handle_or_and_quotes(text, "intitle") for text in texts])
+        results[f"compile.handle_or_and_quotes.or_{size}.calls_per_sec"] = rounds / seconds
+
+        many_parts = [dict.fromkeys(FIELD_ORDER, "") for _ in texts]
+        for parts, text in zip(many_parts, texts):
+            parts["keywords"] = text
+            parts["site"] = "example.com"
+            parts["filetype"] = "pdf"
+        dork_compiler._or_group.cache_clear()
+        seconds, _ = timed(lambda: [put_the_query_together(parts) for parts in many_parts])
+        results[f"compile.put_the_query_together.or_{size}.queries_per_sec"] = rounds / seconds
+
+    # the batch api with lots of repeated fields, which is what the caches are for
+    rng = random.Random(1)
+    batch = [make_parts(rng, number) for number in range(100000)]
+    dork_compiler._or_group.cache_clear()
+    seconds, _ = timed(dork_compiler.compile_batch, batch)
+    results["compile.compile_batch.100k.queries_per_sec"] = len(batch) / seconds
+
+
+def write_journal(path, size):
+    """writes a history journal with size entries straight to disk"""
+    rng = random.Random(size)
+    with open(path, "wb") as f:
+        for number in range(1, size + 1):
+            parts = make_parts(rng, number)
+            f.write(HistoryStore._encode({
+                "op": "add", "id": number,
+                "display_text": put_the_query_together(parts), "query_parts": parts,
+            }))
+
+
+def bench_history(results, size, folder):
+    path = os.path.join(folder, f"history-{size}.jsonl")
+    write_journal(path, size)
+    prefix = f"history.{size}"
+
+    store = HistoryStore(path)
+    index = HistoryIndex(store)
+    store.add_listener(index.on_change)
+    seconds, _ = timed(store.load)
+    results[f"{prefix}.load_s"] = seconds
+
+    rng = random.Random(2)
+    new_parts = [make_parts(rng, size + number) for number in range(1, 201)]
+    for parts in new_parts:
+        parts["keywords"] = f"bench{rng.random()}"
+    seconds, ids = timed(lambda: [store.add(put_the_query_together(parts), parts) for parts in new_parts])
+    results[f"{prefix}.save_ms"] = seconds / len(new_parts) * 1000
+
+    seconds, _ = timed(store.delete, ids[:100])
+    results[f"{prefix}.delete_ms"] = seconds * 1000
+
+    lookups = [put_the_query_together(parts) for parts in new_parts] * 50
+    seconds, _ = timed(lambda: [store.find(query) for query in lookups])
+    results[f"{prefix}.dedup_us"] = seconds / len(lookups) * 1e6
+
+    searches = ("admin", "index of", "site:target42.example.com", "filetype:pdf login", "zzz-nothing")
+    total = 0.0
+    for text in searches:
+        # type it one letter at a time like someone in the search bar would
+        index._last = None
+        for end in range(1, len(text) + 1):
+            seconds, _ = timed(index.search, text[:end])
+            total += seconds
+    results[f"{prefix}.filter_keystroke_ms"] = total / sum(len(text) for text in searches) * 1000
+    store.close()
+
+
+def _traced_bytes(build):
+    """how many bytes are still held once build() is done, according to tracemalloc"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        kept = build()
+        gc.collect()
+        held = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return held
+
+
+# fills the history the way the app does (or the way it used to, with a
+# QListWidget item per entry) and prints how much memory the process uses.
+# most of what the old list held was qt's own, which tracemalloc can't see,
+# so this goes by the resident size instead
+MEMORY_CHILD = """
+import ctypes, gc, json, os, sys, time
+sys.path.insert(0, {here!r})
+from PyQt6.QtCore import Qt
+from PyQt6.QtWidgets import QApplication, QListWidget, QListWidgetItem
+import GDork
+app = QApplication(sys.argv)
+if {mode!r} == "app":
+    window = GDork.GoogleDorkApp()
+    window.show()
+    while not window.history_ready:
+        app.processEvents()
+        time.sleep(0.001)
+    window.tabs.setCurrentIndex(1)
+    app.processEvents()
+else:
+    window = QListWidget()
+    with open("history.jsonl", "rb") as f:
+        for line in f:
+            entry = json.loads(line)
+            item = QListWidgetItem(entry["display_text"])
+            item.setData(Qt.ItemDataRole.UserRole, entry["query_parts"])
+            window.addItem(item)
+    window.show()
+    app.processEvents()
+gc.collect()
+try:
+    # hand back what reading the file left lying around, same for both
+    ctypes.CDLL("libc.so.6").malloc_trim(0)
+except (OSError, AttributeError):
+    pass
+with open("/proc/self/statm") as f:
+    print(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+"""
+
+
+def _process_bytes(mode, workdir):
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    env.pop("GDORK_STARTUP_REPORT", None)
+    env.pop("GDORK_HISTORY", None)
+    output = subprocess.run([sys.executable, "-c", MEMORY_CHILD.format(here=HERE, mode=mode)],
+                            cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    return int(output.stdout.strip().splitlines()[-1])
+
+
+def bench_memory(results, size, folder):
+    """
+    bytes per history entry: the python side of the store, search index and
+    groups from tracemalloc, and if pyqt6 is there, the whole app against the
+    old QListWidget history by process size (the same run with an empty
+    history taken off, so the window itself doesn't count)
+    """
+    path = os.path.join(folder, f"memory-{size}.jsonl")
+    write_journal(path, size)
+    prefix = f"memory.{size}"
+
+    def store():
+        history = HistoryStore(path)
+        history.load()
+        history.close()
+        return history
+    history = store()
+
+    def index():
+        built = HistoryIndex(history)
+        for entry_id, entry in history.items():
+            built.on_change("add", entry_id, entry)
+        return built
+
+    def groups():
+        built = HistoryGroups(history)
+        for entry_id, entry in history.items():
+            built.on_change("add", entry_id, entry)
+        return built
+
+    results[f"{prefix}.store_bytes_per_entry"] = _traced_bytes(store) / size
+    results[f"{prefix}.index_bytes_per_entry"] = _traced_bytes(index) / size
+    results[f"{prefix}.groups_bytes_per_entry"] = _traced_bytes(groups) / size
+    del history
+
+    try:
+        import PyQt6  # noqa: F401
+    except ImportError:
+        os.remove(path)
+        return
+    empty = os.path.join(folder, "memory-empty")
+    full = os.path.join(folder, f"memory-full-{size}")
+    for workdir in (empty, full):
+        os.makedirs(workdir, exist_ok=True)
+    open(os.path.join(empty, "history.jsonl"), "w").close()
+    os.replace(path, os.path.join(full, "history.jsonl"))
+    for mode in ("app", "old_widgets"):
+        held = _process_bytes(mode, full) - _process_bytes(mode, empty)
+        results[f"{prefix}.{mode}_bytes_per_entry"] = held / size
+    results[f"{prefix}.app_vs_old_widgets_ratio"] = (
+        results[f"{prefix}.app_bytes_per_entry"] / results[f"{prefix}.old_widgets_bytes_per_entry"])
+    os.remove(os.path.join(full, "history.jsonl"))
+
+
+STARTUP_CHILD = """
+import sys, time, json
+sys.path.insert(0, {here!r})
+import GDork
+from PyQt6.QtWidgets import QApplication
+app = QApplication(sys.argv)
+window = GDork.GoogleDorkApp()
+window.show()
+while not window.history_ready:
+    app.processEvents()
+    time.sleep(0.001)
+window.tabs.setCurrentIndex(1)
+app.processEvents()
+window.close()
+print(json.dumps(window.startup_times))
+"""
+
+
+def bench_startup(results, size, folder):
+    """starts the gui in a fresh process against a history of this size"""
+    path = os.path.join(folder, f"history-{size}.jsonl")
+    if not os.path.exists(path):
+        write_journal(path, size)
+    workdir = os.path.join(folder, f"startup-{size}")
+    os.makedirs(workdir, exist_ok=True)
+    os.replace(path, os.path.join(workdir, "history.jsonl"))
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    env.pop("GDORK_STARTUP_REPORT", None)
+    env.pop("GDORK_HISTORY", None)
+    started = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", STARTUP_CHILD.format(here=HERE)],
+                            cwd=workdir, env=env, capture_output=True, text=True, check=True)
+    results[f"startup.{size}.process_s"] = time.perf_counter() - started
+    times = json.loads(output.stdout.strip().splitlines()[-1])
+    for name, ms in times.items():
+        results[f"startup.{size}.{name.replace(' ', '_')}_ms"] = ms
+
+
+def bench_preview(results, folder):
+    """keystroke bursts into a box that already holds thousands of OR terms"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtTest import QTest
+    import GDork
+
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    old_cwd = os.getcwd()
+    os.chdir(folder)
+    # the window has to use a history.jsonl in the scratch folder, never a shared one
+    shared_history = os.environ.pop("GDORK_HISTORY", None)
+    try:
+        window = GDork.GoogleDorkApp()
+        window.wait_for_history()
+        window.widgets["keywords"].setText(", ".join(f"term{i} word" for i in range(5000)))
+        window.widgets["site"].setText(", ".join(f"host{i}.example.com" for i in range(2000)))
+        window.update_preview()
+
+        update_times = []
+        real_update = window.update_preview
+
+        def measured_update(*args):
+            started = time.perf_counter()
+            real_update(*args)
+            update_times.append(time.perf_counter() - started)
+        window.preview_timer.timeout.disconnect()
+        window.preview_timer.timeout.connect(measured_update)
+
+        burst_times = []
+        box = window.widgets["in_url"]
+        for burst in range(30):
+            box.clear()
+            started = time.perf_counter()
+            QTest.keyClicks(box, f"admin{burst}.php")
+            while window.preview_timer.isActive() or window.changed_fields:
+                app.processEvents()
+            burst_times.append(time.perf_counter() - started)
+        window.close()
+    finally:
+        os.chdir(old_cwd)
+        if shared_history is not None:
+            os.environ["GDORK_HISTORY"] = shared_history
+
+    update_times.sort()
+    burst_times.sort()
+    results["preview.update_p50_ms"] = update_times[len(update_times) // 2] * 1000
+    results["preview.update_p95_ms"] = update_times[int(len(update_times) * 0.95)] * 1000
+    results["preview.burst_p50_ms"] = burst_times[len(burst_times) // 2] * 1000
+
+
+def compare(results, baseline, tolerance):
+    """gives back a list of what got worse than the baseline by more than tolerance"""
+    worse = []
+    for name, old in baseline.get("results", {}).items():
+        new = results.get(name)
+        if new is None or not old:
+            continue
+        if name.endswith("_per_sec"):
+            change = (old - new) / old
+        else:
+            change = (new - old) / old
+        if change > tolerance:
+            worse.append(f"{name}: {old:.4g} -> {new:.4g} ({change:+.0%} worse)")
+    return worse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmarks for the dorking assistant")
+    parser.add_argument("--out", help="where to write the json results")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in HISTORY_SIZES),
+                        help="history sizes to try, comma separated")
+    parser.add_argument("--skip-gui", action="store_true", help="leave out startup and preview")
+    parser.add_argument("--compare", help="an earlier results file to check against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="how much worse counts as a regression (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+
+    results = {}
+    bench_compile(results)
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            bench_history(results, size, folder)
+            if size <= MEMORY_MAX_SIZE:
+                bench_memory(results, size, folder)
+        if not args.skip_gui:
+            try:
+                import PyQt6  # noqa: F401
+            except ImportError:
+                print("pyqt6 isn't installed, skipping the gui benchmarks", file=sys.stderr)
+            else:
+                for size in sizes:
+                    bench_startup(results, size, folder)
+                bench_preview(results, folder)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "when": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            worse = compare(results, json.load(f), args.tolerance)
+        for line in worse:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if worse:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""
+command line version of the dorking assistant, for scripts and ci jobs.
+pyqt6 only gets imported if you actually ask for the gui, so everything else
+starts about as fast as python itself.
+
+    python dork_cli.py compile --site example.com --intitle "index of" --filetype pdf
+    python dork_cli.py compile --file dorks.jsonl
+    echo '{"keywords": "admin, login"}' | python dork_cli.py compile
+    python dork_cli.py plan --site "a.com, b.com, c.com" --intitle "index of" --max-terms 32
+    python dork_cli.py expand targets.txt templates.json out.txt --workers 8
+    python dork_cli.py run --endpoint http://127.0.0.1:8000/search --file out.txt --out results.jsonl
+    python dork_cli.py history list
+    python dork_cli.py history search "site:example.com"
+    python dork_cli.py history export dorks.txt
+    python dork_cli.py history import curated_dorks.txt
+    python dork_cli.py stats profile.json
+    python dork_cli.py gui
+"""
+import argparse
+import json
+import sys
+
+from dork_compiler import FIELD_ORDER, compile_batch
+from history_store import OLD_HISTORY_FILE, HistoryStore, history_path
+
+# command line flag -> query_parts key
+FIELD_FLAGS = {
+    "keywords": "keywords", "exclude": "exclude_keywords", "site": "site",
+    "intitle": "in_title", "inurl": "in_url", "intext": "in_text",
+    "related": "related", "cache": "cache", "filetype": "filetype",
+}
+
+
+def positive_number(text):
+    """an argparse type for things like --rate that can't be 0 or less"""
+    number = float(text)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"has to be more than 0, not {text}")
+    return number
+
+
+def read_query_parts(stream):
+    """reads query_parts from a json list, a single json object or jsonl"""
+    text = stream.read()
+    stripped = text.strip()
+    if not stripped:
+        return []
+    if stripped.startswith("["):
+        entries = json.loads(stripped)
+    else:
+        try:
+            entries = [json.loads(stripped)]
+        except ValueError:
+            entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+    # history entries keep the parts inside "query_parts"
+    return [entry.get("query_parts", entry) for entry in entries]
+
+
+def in_field_order(parts):
+    """fills in the missing boxes so the output matches the builder tab"""
+    return {key: parts.get(key, "") for key in FIELD_ORDER}
+
+
+def parts_from_args(args):
+    """query_parts from the field flags, or else from --file or stdin"""
+    from_flags = {FIELD_FLAGS[flag]: value.strip()
+                  for flag, value in vars(args).items()
+                  if flag in FIELD_FLAGS and value}
+    if from_flags:
+        many_parts = [from_flags]
+    elif args.file and args.file != "-":
+        with open(args.file, "r", encoding="utf-8") as f:
+            many_parts = read_query_parts(f)
+    else:
+        many_parts = read_query_parts(sys.stdin)
+    return [in_field_order(parts) for parts in many_parts]
+
+
+def do_compile(args):
+    queries = compile_batch(parts_from_args(args))
+    sys.stdout.write("".join(query + "\n" for query in queries))
+    return 0
+
+
+def do_plan(args):
+    import dork_planner
+    for parts in parts_from_args(args):
+        plan = dork_planner.plan_queries(parts, max_terms=args.max_terms, max_length=args.max_length)
+        print(plan.report(), file=sys.stderr)
+        for query in plan.iter_queries():
+            sys.stdout.write(query + "\n")
+    return 0
+
+
+def do_expand(args):
+    import dork_expander
+    targets = dork_expander.read_targets(args.targets)
+    templates = dork_expander.load_templates(args.templates)
+    if args.workers and args.workers > 1:
+        count = dork_expander.expand_parallel_to_file(
+            targets, templates, args.out, workers=args.workers, chunk_size=args.chunk_size)
+    else:
+        count = dork_expander.expand_to_file(targets, templates, args.out)
+    print(f"wrote {count} queries to {args.out}", file=sys.stderr)
+    return 0
+
+
+def do_run(args):
+    import dork_runner
+    options = dict(concurrency=args.concurrency, rate=args.rate, burst=args.burst,
+                   retries=args.retries, param=args.param, timeout=args.timeout)
+    cache = None
+    if args.cache:
+        from result_cache import ResultCache
+        cache = options["cache"] = ResultCache(
+            args.cache, ttl=args.cache_ttl * 3600, max_bytes=int(args.cache_size * 1024 * 1024))
+    try:
+        if args.file and args.file != "-":
+            with open(args.file, "r", encoding="utf-8") as f:
+                ok, failed = dork_runner.run_queries_to_file(f, args.endpoint, args.out, **options)
+        else:
+            ok, failed = dork_runner.run_queries_to_file(sys.stdin, args.endpoint, args.out, **options)
+    finally:
+        if cache is not None:
+            print(f"cache: {json.dumps(cache.stats())}", file=sys.stderr)
+            cache.close()
+    print(f"{ok} ok, {failed} failed, results in {args.out}", file=sys.stderr)
+    return 0 if not failed else 1
+
+
+def open_history(args, read_only=False):
+    store = HistoryStore(args.history, legacy_path=args.old_history, read_only=read_only)
+    store.load()
+    return store
+
+
+def print_entries(store, ids, as_json):
+    out = sys.stdout
+    for entry_id in ids:
+        entry = store.get(entry_id)
+        if as_json:
+            out.write(json.dumps({"id": entry_id, **entry}) + "\n")
+        else:
+            out.write(entry["display_text"] + "\n")
+
+
+def do_history(args):
+    # only importing writes anything, the rest leave the files alone
+    store = open_history(args, read_only=args.action != "import")
+    try:
+        if args.action == "list":
+            print_entries(store, [entry_id for entry_id, _ in store.items()], args.json)
+        elif args.action == "search":
+            from history_search import HistoryIndex
+            index = HistoryIndex(store)
+            for entry_id, entry in store.items():
+                index.on_change("add", entry_id, entry)
+            print_entries(store, index.search(args.text), args.json)
+        elif args.action == "export":
+            from history_export import export_history
+            count = export_history(store, args.out, fmt=args.format)
+            print(f"exported {count} queries to {args.out}", file=sys.stderr)
+        elif args.action == "import":
+            from history_store import import_dorks
+            with open(args.file, "r", encoding="utf-8", errors="replace") as f:
+                added, skipped, unparseable = import_dorks(store, f, batch_size=args.batch_size)
+            print(f"imported {added} dork(s), skipped {skipped} duplicate(s)"
+                  f" and {unparseable} unparseable line(s)", file=sys.stderr)
+    finally:
+        store.close()
+    return 0
+
+
+def do_stats(args):
+    from dork_profiler import format_stats
+    with open(args.file, "r") as f:
+        stats = json.load(f)
+    if args.json:
+        json.dump(stats, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print(format_stats(stats))
+    return 0
+
+
+def do_gui(args):
+    # only now do we pay for importing pyqt6
+    import GDork
+    return GDork.main([sys.argv[0]])
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog="gdork", description="Google Dorking Assistant")
+    commands = parser.add_subparsers(dest="command")
+
+    compile_cmd = commands.add_parser("compile", help="turn query parts into dork strings")
+    plan_cmd = commands.add_parser("plan", help="split long OR lists into as few queries as fit")
+    for command in (compile_cmd, plan_cmd):
+        for flag, key in FIELD_FLAGS.items():
+            command.add_argument(f"--{flag}", help=f"value for {key} (use comma for OR)")
+        command.add_argument("--file", help="json/jsonl file of query_parts, - for stdin")
+    compile_cmd.set_defaults(run=do_compile)
+    plan_cmd.add_argument("--max-terms", type=int, default=32, help="most words one query can have")
+    plan_cmd.add_argument("--max-length", type=int, default=2048, help="most characters one query can have")
+    plan_cmd.set_defaults(run=do_plan)
+
+    expand_cmd = commands.add_parser("expand", help="cross targets with templates into a file")
+    expand_cmd.add_argument("targets", help="file with one site per line")
+    expand_cmd.add_argument("templates", help="json/jsonl file of query_parts templates")
+    expand_cmd.add_argument("out", help="where the queries go")
+    expand_cmd.add_argument("--workers", type=int, default=1, help="worker processes")
+    expand_cmd.add_argument("--chunk-size", type=int, default=200, help="targets per worker chunk")
+    expand_cmd.set_defaults(run=do_expand)
+
+    run_cmd = commands.add_parser("run", help="send compiled queries to a search api endpoint")
+    run_cmd.add_argument("--endpoint", required=True, help="e.g. http://127.0.0.1:8000/search")
+    run_cmd.add_argument("--file", help="file with one query per line (default stdin)")
+    run_cmd.add_argument("--out", required=True, help="jsonl file the results get added to")
+    run_cmd.add_argument("--param", default="q", help="url parameter the query goes in")
+    run_cmd.add_argument("--concurrency", type=int, default=16, help="requests in flight at once")
+    run_cmd.add_argument("--rate", type=positive_number, default=5.0, help="requests per second")
+    run_cmd.add_argument("--burst", type=float, help="how many requests can go at once after a pause")
+    run_cmd.add_argument("--retries", type=int, default=3, help="retries per query")
+    run_cmd.add_argument("--timeout", type=float, default=30.0, help="seconds per request")
+    run_cmd.add_argument("--cache", help="sqlite file to cache results in between runs")
+    run_cmd.add_argument("--cache-ttl", type=float, default=24 * 7, help="hours a cached result stays fresh")
+    run_cmd.add_argument("--cache-size", type=float, default=256, help="MB before old results get dropped")
+    run_cmd.set_defaults(run=do_run)
+
+    history_cmd = commands.add_parser("history", help="read, search or export the saved history")
+    history_cmd.add_argument("--history", default=history_path(),
+                             help="history journal file (default: $GDORK_HISTORY or ./history.jsonl)")
+    history_cmd.add_argument("--old-history", default=OLD_HISTORY_FILE, help=argparse.SUPPRESS)
+    history_cmd.add_argument("--json", action="store_true", help="print jsonl with id and query_parts")
+    actions = history_cmd.add_subparsers(dest="action", required=True)
+    actions.add_parser("list", help="print every saved query")
+    search_cmd = actions.add_parser("search", help="print saved queries that match")
+    search_cmd.add_argument("text", help="text to look for, site:/filetype: and friends work too")
+    export_cmd = actions.add_parser("export", help="write saved queries to a file")
+    export_cmd.add_argument("out", help="file name picks the format, e.g. dorks.csv or dorks.jsonl.gz")
+    export_cmd.add_argument("--format", choices=("txt", "jsonl", "csv"), help="override the format")
+    import_cmd = actions.add_parser("import", help="add raw dorks from a text file, one per line")
+    import_cmd.add_argument("file")
+    import_cmd.add_argument("--batch-size", type=int, default=10000, help="entries per journal record")
+    history_cmd.set_defaults(run=do_history)
+
+    stats_cmd = commands.add_parser("stats", help="show timings dumped by GDORK_PROFILE=file.json")
+    stats_cmd.add_argument("file")
+    stats_cmd.add_argument("--json", action="store_true", help="print the raw json instead of a table")
+    stats_cmd.set_defaults(run=do_stats)
+
+    gui_cmd = commands.add_parser("gui", help="open the desktop app (the default)")
+    gui_cmd.set_defaults(run=do_gui)
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    if args.command is None:
+        return do_gui(args)
+    try:
+        return args.run(args)
+    except BrokenPipeError:
+        # someone piped us into head, that's fine
+        sys.stderr.close()
+        return 0
+    except (IOError, OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
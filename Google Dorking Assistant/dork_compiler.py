@@ -0,0 +1,139 @@
+"""
+the bits that turn query_parts into a dork string, with no qt stuff in here
+so it can run on a server with no screen. GDork.py uses this too.
+"""
+from functools import lru_cache
+
+# the input boxes in the same order the builder tab makes them
+FIELD_ORDER = (
+    "keywords", "exclude_keywords", "site", "in_title", "in_url",
+    "in_text", "related", "cache", "filetype",
+)
+
+# "in_title" -> "intitle:" and so on, worked out once
+_PREFIXES = {key: key.replace('_', '') + ":" for key in FIELD_ORDER}
+
+
+def operator_prefix(key):
+    """gives back the 'operator:' bit for a query_parts key"""
+    prefix = _PREFIXES.get(key)
+    if prefix is None:
+        prefix = _PREFIXES[key] = key.replace('_', '') + ":"
+    return prefix
+
+
+def split_commas(text):
+    """splits a box on its commas, leaving the ones inside "quotes" alone"""
+    if '"' not in text:
+        return text.split(',')
+    parts = []
+    start = 0
+    quoted = False
+    for position, char in enumerate(text):
+        if char == '"':
+            quoted = not quoted
+        elif char == ',' and not quoted:
+            parts.append(text[start:position])
+            start = position + 1
+    parts.append(text[start:])
+    return parts
+
+
+def quote_part(part):
+    """puts quotes around a part if it has a space and isn't quoted already"""
+    if ' ' in part and not (part.startswith('"') and part.endswith('"')):
+        return f'"{part}"'
+    return part
+
+
+@lru_cache(maxsize=8192)
+def _or_group(text, prefix):
+    """splits and quotes one field, cached so the same text is only done once"""
+    bits = [prefix + quote_part(part.strip()) for part in split_commas(text)]
+    # if there are multiple parts, wrap them in ( ... OR ... )
+    if len(bits) > 1:
+        return "(" + " OR ".join(bits) + ")"
+    return bits[0]
+
+
+@lru_cache(maxsize=8192)
+def _exclusions(text):
+    """turns 'a, b c' into '-a -"b c"'"""
+    return " ".join("-" + quote_part(word.strip()) for word in split_commas(text))
+
+
+def handle_or_and_quotes(text, operator=""):
+    """handles the comma for 'OR' and adds quotes"""
+    if not text:
+        return ""
+    return _or_group(text, f"{operator}:" if operator else "")
+
+
+def field_fragment(key, value):
+    """the compiled bit of the query for one field, or '' if it's empty"""
+    if not value:
+        return ""
+    if key == "keywords":
+        return _or_group(value, "")
+    if key == "exclude_keywords":
+        return _exclusions(value)
+    return _or_group(value, operator_prefix(key))
+
+
+def put_the_query_together(parts):
+    """builds the final query string from all the pieces"""
+    all_the_parts = []
+
+    keywords = parts.get("keywords")
+    if keywords:
+        all_the_parts.append(_or_group(keywords, ""))
+
+    for key, value in parts.items():
+        if key == "keywords" or key == "exclude_keywords" or not value:
+            continue
+        all_the_parts.append(_or_group(value, operator_prefix(key)))
+
+    excluded = parts.get("exclude_keywords")
+    if excluded:
+        all_the_parts.append(_exclusions(excluded))
+
+    return " ".join(filter(None, all_the_parts))
+
+
+class QueryFragments:
+    """
+    keeps the compiled bit of every field around, so when one box changes
+    only that box gets split and quoted again and the rest is just joined.
+    """
+
+    def __init__(self, keys=FIELD_ORDER):
+        self._values = dict.fromkeys(keys, "")
+        self._fragments = dict.fromkeys(keys, "")
+
+    def update(self, key, value):
+        """sets one field, gives back True if it actually changed"""
+        if self._values.get(key) == value:
+            return False
+        self._values[key] = value
+        self._fragments[key] = field_fragment(key, value)
+        return True
+
+    def parts(self):
+        return dict(self._values)
+
+    def query(self):
+        """the whole query, same as put_the_query_together(self.parts())"""
+        fragments = self._fragments
+        middle = [fragment for key, fragment in fragments.items()
+                  if key != "keywords" and key != "exclude_keywords"]
+        all_the_parts = [fragments.get("keywords", "")] + middle + [fragments.get("exclude_keywords", "")]
+        return " ".join(filter(None, all_the_parts))
+
+
+def compile_batch(many_parts):
+    """
+    compiles a whole bunch of query_parts dicts in one go and gives back
+    the query strings in the same order. fields that repeat across the batch
+    (same site, same filetype...) only get split and quoted once.
+    """
+    return [put_the_query_together(parts) for parts in many_parts]
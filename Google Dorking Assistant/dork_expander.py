@@ -0,0 +1,252 @@
+"""
+crosses a big list of targets (the site: field) with a list of dork templates
+and streams every query straight to a file. nothing here ever keeps the whole
+target x template product around, and a crashed run can carry on where it
+stopped thanks to a little .progress file next to the output.
+"""
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from dork_compiler import FIELD_ORDER, handle_or_and_quotes, put_the_query_together
+
+# how many queries we write between progress saves
+CHECKPOINT_EVERY = 50000
+
+# how many targets each worker gets at a time in parallel mode
+CHUNK_SIZE = 200
+
+
+def read_targets(path):
+    """reads a targets file one line at a time, skipping blanks and # comments"""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield line
+
+
+def load_templates(path):
+    """loads templates from a json list or a jsonl file of query_parts dicts"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        entries = json.loads(stripped)
+    else:
+        entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+    # history.json entries have the parts tucked inside "query_parts"
+    return [entry.get("query_parts", entry) for entry in entries]
+
+
+def split_template(template):
+    """
+    compiles everything in a template except the site, so each target only
+    needs its site bit made. gives back (before_site, after_site).
+    """
+    before = {}
+    after = {}
+    seen_site = False
+    for key in FIELD_ORDER:
+        if key == "site":
+            seen_site = True
+        elif key == "exclude_keywords":
+            continue
+        elif seen_site:
+            after[key] = template.get(key, "")
+        else:
+            before[key] = template.get(key, "")
+    # exclusions always go last, same as put_the_query_together
+    after["exclude_keywords"] = template.get("exclude_keywords", "")
+    return put_the_query_together(before), put_the_query_together(after)
+
+
+def expand(targets, templates):
+    """yields one query for every target x template, targets on the outside"""
+    pieces = [split_template(template) for template in templates]
+    for target in targets:
+        site_bit = handle_or_and_quotes(target, "site")
+        for before, after in pieces:
+            yield " ".join(filter(None, (before, site_bit, after)))
+
+
+def templates_fingerprint(templates):
+    """a short hash of the templates so we don't resume with different ones"""
+    blob = json.dumps([split_template(t) for t in templates]).encode("utf-8")
+    return hashlib.sha1(blob).hexdigest()
+
+
+def _progress_path(out_path):
+    return out_path + ".progress"
+
+
+def _save_progress(out_path, progress):
+    """writes the progress file to a temp name first so it's never half written"""
+    temp_path = _progress_path(out_path) + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(progress, f)
+    os.replace(temp_path, _progress_path(out_path))
+
+
+def _load_progress(out_path):
+    try:
+        with open(_progress_path(out_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (IOError, json.JSONDecodeError):
+        return None
+
+
+def expand_to_file(targets, templates, out_path, resume=True,
+                   checkpoint_every=CHECKPOINT_EVERY):
+    """
+    writes every target x template query to out_path, one per line.
+    if resume is on and a .progress file is there from a run that died,
+    we chop off anything after the last checkpoint and carry on from it.
+    gives back how many queries are in the file when it's done.
+    """
+    templates = list(templates)
+    if not templates:
+        raise ValueError("need at least one template to expand")
+    fingerprint = templates_fingerprint(templates)
+
+    done = 0
+    offset = 0
+    progress = _load_progress(out_path) if resume else None
+    if progress and os.path.exists(out_path):
+        if progress.get("templates") != fingerprint:
+            raise ValueError("templates changed since the last run, can't resume")
+        done = progress["done"]
+        offset = progress["offset"]
+
+    mode = "r+b" if offset else "wb"
+    with open(out_path, mode) as f:
+        # throw away anything written after the last checkpoint
+        f.seek(offset)
+        f.truncate()
+
+        per_target = len(templates)
+        skip_targets, skip_templates = divmod(done, per_target)
+        queries = expand(itertools.islice(targets, skip_targets, None), templates)
+        queries = itertools.islice(queries, skip_templates, None)
+
+        since_checkpoint = 0
+        for query in queries:
+            f.write(query.encode("utf-8"))
+            f.write(b"\n")
+            done += 1
+            since_checkpoint += 1
+            if since_checkpoint >= checkpoint_every:
+                f.flush()
+                os.fsync(f.fileno())
+                _save_progress(out_path, {
+                    "done": done, "offset": f.tell(), "templates": fingerprint,
+                })
+                since_checkpoint = 0
+
+    # all done, so there's nothing to resume next time
+    if os.path.exists(_progress_path(out_path)):
+        os.remove(_progress_path(out_path))
+    return done
+
+
+# the split templates, set once in each worker process
+_worker_pieces = None
+
+
+def _start_worker(pieces):
+    global _worker_pieces
+    _worker_pieces = pieces
+
+
+def _write_shard(shard_path, targets):
+    """compiles one chunk of targets into its own shard file"""
+    count = 0
+    with open(shard_path, "wb") as f:
+        for target in targets:
+            site_bit = handle_or_and_quotes(target, "site")
+            lines = [" ".join(filter(None, (before, site_bit, after)))
+                     for before, after in _worker_pieces]
+            f.write(("\n".join(lines) + "\n").encode("utf-8"))
+            count += len(lines)
+    return count
+
+
+def _chunks(targets, size):
+    targets = iter(targets)
+    while True:
+        chunk = list(itertools.islice(targets, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def expand_parallel_to_file(targets, templates, out_path, workers=None,
+                            chunk_size=CHUNK_SIZE):
+    """
+    same output as expand_to_file, byte for byte, but the targets get cut into
+    chunks of chunk_size and compiled in a pool of worker processes. every
+    chunk goes to its own shard file and the shards get glued onto out_path
+    in chunk order, so the result doesn't depend on which worker finished first.
+    only a couple of chunks per worker are in flight at once to keep memory flat.
+    """
+    templates = list(templates)
+    if not templates:
+        raise ValueError("need at least one template to expand")
+    workers = workers or os.cpu_count() or 1
+    if chunk_size < 1:
+        raise ValueError("chunk_size has to be at least 1")
+    pieces = [split_template(template) for template in templates]
+
+    done = 0
+    in_flight = []
+    shard_number = 0
+    with open(out_path, "wb") as out, ProcessPoolExecutor(
+            max_workers=workers, initializer=_start_worker, initargs=(pieces,)) as pool:
+
+        def merge_oldest():
+            # always glue the oldest chunk on next so the order stays fixed
+            shard_path, future = in_flight.pop(0)
+            try:
+                count = future.result()
+                with open(shard_path, "rb") as shard:
+                    shutil.copyfileobj(shard, out, 1024 * 1024)
+            finally:
+                if os.path.exists(shard_path):
+                    os.remove(shard_path)
+            return count
+
+        try:
+            for chunk in _chunks(targets, chunk_size):
+                shard_path = f"{out_path}.shard-{shard_number:06d}"
+                shard_number += 1
+                in_flight.append((shard_path, pool.submit(_write_shard, shard_path, chunk)))
+                if len(in_flight) >= workers * 2:
+                    done += merge_oldest()
+            while in_flight:
+                done += merge_oldest()
+        finally:
+            # if something blew up, don't leave shards lying around
+            for shard_path, future in in_flight:
+                future.cancel()
+            pool.shutdown(wait=True)
+            for shard_path, _ in in_flight:
+                if os.path.exists(shard_path):
+                    os.remove(shard_path)
+    return done
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (4, 5):
+        print("usage: python dork_expander.py TARGETS.txt TEMPLATES.json OUT.txt [WORKERS]")
+        sys.exit(2)
+    targets = read_targets(sys.argv[1])
+    templates = load_templates(sys.argv[2])
+    if len(sys.argv) == 5:
+        count = expand_parallel_to_file(targets, templates, sys.argv[3], workers=int(sys.argv[4]))
+    else:
+        count = expand_to_file(targets, templates, sys.argv[3])
+    print(f"wrote {count} queries to {sys.argv[3]}")
@@ -0,0 +1,260 @@
+"""
+reads compiled dork strings back apart. the tokenizer understands what
+handle_or_and_quotes puts out: operator:value terms, "quoted phrases",
+-exclusions, ( ... OR ... ) groups and -( ... ) excluded groups.
+"""
+import re
+
+from dork_compiler import FIELD_ORDER, put_the_query_together
+
+_OPERATOR = re.compile(r"([A-Za-z_]+):")
+
+
+def tokenize(query):
+    """
+    splits a dork into tokens. brackets come back as "(" and ")" (or "-("
+    for an excluded group), a bare OR as "OR", and every other term as a
+    (negated, operator, value) tuple with the value exactly as written
+    (quotes and all).
+    """
+    tokens = []
+    position = 0
+    length = len(query)
+    while position < length:
+        char = query[position]
+        if char.isspace():
+            position += 1
+            continue
+        if char in "()":
+            tokens.append(char)
+            position += 1
+            continue
+        if query.startswith("-(", position):
+            tokens.append("-(")
+            position += 2
+            continue
+
+        negated = False
+        if char == "-" and position + 1 < length and not query[position + 1].isspace() \
+                and query[position + 1] not in "()":
+            negated = True
+            position += 1
+        operator = ""
+        match = _OPERATOR.match(query, position)
+        if match:
+            operator = match.group(1)
+            position = match.end()
+
+        if position < length and query[position] == '"':
+            end = query.find('"', position + 1)
+            end = length if end == -1 else end + 1
+        else:
+            end = position
+            while end < length and not query[end].isspace() and query[end] not in "()":
+                end += 1
+        value = query[position:end]
+        position = end
+
+        if not negated and not operator and value == "OR":
+            tokens.append("OR")
+        else:
+            tokens.append((negated, operator, value))
+    return tokens
+
+
+class Excluded(list):
+    """an expression from a -( ... ) group, none of its alternatives may match"""
+
+
+def parse(query):
+    """
+    turns a dork into nested lists: an expression is a list of alternatives
+    (things OR'd together), each alternative is a list of items (AND'd), and
+    each item is either a term tuple or another expression from a bracket.
+    -(a OR b) is the same as -a -b, so it comes back as those two terms; an
+    excluded group that can't be split up like that comes back Excluded.
+    """
+    tokens = tokenize(query)
+    position = 0
+
+    def expression(inside_brackets):
+        nonlocal position
+        alternatives = [[]]
+        while position < len(tokens):
+            token = tokens[position]
+            position += 1
+            if token == ")":
+                if inside_brackets:
+                    break
+                # a stray ")" at the top doesn't close anything, skip it
+                continue
+            if token == "(":
+                alternatives[-1].append(expression(True))
+            elif token == "-(":
+                inner = expression(True)
+                if all(len(alternative) == 1 and isinstance(alternative[0], tuple)
+                       and not alternative[0][0] for alternative in inner):
+                    alternatives[-1].extend((True, operator, value)
+                                            for (_, operator, value), in inner)
+                elif inner:
+                    alternatives[-1].append(Excluded(inner))
+            elif token == "OR":
+                alternatives.append([])
+            else:
+                alternatives[-1].append(token)
+        return [alternative for alternative in alternatives if alternative]
+
+    return expression(False)
+
+
+def clean_value(value):
+    """takes the quotes off a value and tidies its spacing and case"""
+    if len(value) >= 2 and value.startswith('"') and value.endswith('"'):
+        value = value[1:-1]
+    elif value.startswith('"'):
+        value = value[1:]
+    return " ".join(value.split()).lower()
+
+
+def _canonical_term(term):
+    negated, operator, value = term
+    value = clean_value(value)
+    if ' ' in value:
+        value = f'"{value}"'
+    return ("-" if negated else "") + (operator.lower() + ":" if operator else "") + value
+
+
+def _canonical_items(alternative):
+    """the canonical AND'd items of one alternative, brackets flattened where we can"""
+    items = set()
+    for item in alternative:
+        if isinstance(item, tuple):
+            items.add(_canonical_term(item))
+        elif isinstance(item, Excluded):
+            items.add("-(" + _canonical_expression(item, top=True) + ")")
+        elif len(item) == 1:
+            # a bracket with no OR in it is just more AND'd items
+            items |= _canonical_items(item[0])
+        elif item:
+            items.add(_canonical_expression(item))
+    items.discard("")
+    return items
+
+
+def _canonical_expression(alternatives, top=False):
+    finished = set()
+    for alternative in alternatives:
+        items = _canonical_items(alternative)
+        if len(items) > 1 and len(alternatives) > 1:
+            finished.add("(" + " ".join(sorted(items)) + ")")
+        elif items:
+            finished.add(" ".join(sorted(items)))
+    if len(finished) == 1:
+        return finished.pop()
+    joined = " OR ".join(sorted(finished))
+    return joined if top else f"({joined})"
+
+
+def canonical_query(query):
+    """
+    one spelling for queries that mean the same thing: OR alternatives and
+    AND'd terms are sorted, duplicates dropped, quotes only where there's a
+    space, and everything lowercased. so "(intitle:b OR intitle:a)" and
+    "(intitle:\"a\" OR intitle:b)" come out the same, and so does
+    "intitle:a OR intitle:b" since brackets around the whole query don't count.
+    """
+    alternatives = parse(query)
+    while len(alternatives) == 1 and len(alternatives[0]) == 1 \
+            and isinstance(alternatives[0][0], list) and not isinstance(alternatives[0][0], Excluded):
+        alternatives = alternatives[0][0]
+    return _canonical_expression(alternatives, top=True)
+
+
+# dork operators -> the query_parts key the builder keeps them in
+OPERATOR_FIELDS = {
+    "site": "site", "intitle": "in_title", "inurl": "in_url", "intext": "in_text",
+    "related": "related", "cache": "cache", "filetype": "filetype",
+}
+
+
+def _field_value(value):
+    """
+    what to put in a builder box so handle_or_and_quotes gives back the same
+    text: quotes come off only when there's a space inside (they get put
+    back), and a value with a comma keeps them so the box doesn't split there
+    """
+    quoted = len(value) >= 2 and value.startswith('"') and value.endswith('"')
+    if ',' in value:
+        return value if quoted else f'"{value}"'
+    if quoted and ' ' in value:
+        return value[1:-1]
+    return value
+
+
+def parse_dork(query):
+    """
+    turns a raw dork line back into a query_parts dict with the same keys as the
+    builder boxes. anything the builder made comes back exactly; other dorks
+    get the closest thing the boxes can hold: AND'd bare words become one
+    phrase, several quoted phrases share the keywords box (so they're OR'd),
+    and operators the builder doesn't have stay in keywords as written. use
+    dork_entry() to find out whether that's still the same query.
+    """
+    fields = {key: [] for key in ("keywords", "exclude_keywords", *OPERATOR_FIELDS.values())}
+    loose_words = []
+
+    def add_term(term, in_group):
+        negated, operator, value = term
+        key = OPERATOR_FIELDS.get(operator.lower())
+        if negated:
+            fields["exclude_keywords"].append(
+                _field_value(value) if not operator else f"{operator}:{value}")
+        elif key:
+            fields[key].append(_field_value(value))
+        elif operator:
+            fields["keywords"].append(f"{operator}:{value}")
+        elif in_group or value.startswith('"'):
+            fields["keywords"].append(_field_value(value))
+        else:
+            loose_words.append(value)
+
+    def add_items(alternative, in_group):
+        for item in alternative:
+            if isinstance(item, tuple):
+                add_term(item, in_group)
+            elif isinstance(item, Excluded):
+                # there's no box for a group like -(a b), so it gets left out
+                continue
+            else:
+                for inner in item:
+                    add_items(inner, True)
+
+    alternatives = parse(query)
+    if len(alternatives) > 1:
+        alternatives = [[alternatives]]
+    for alternative in alternatives:
+        add_items(alternative, False)
+    if loose_words:
+        fields["keywords"].append(" ".join(loose_words))
+
+    return {key: ", ".join(fields[key]) for key in FIELD_ORDER}
+
+
+def dork_entry(line):
+    """
+    what the history keeps for a raw dork line: (display_text, query_parts),
+    or None when there's nothing in it to search for. if the boxes mean the
+    same thing as the line, the text is what they compile to (so anything the
+    builder made comes back as it was). if they can't say it, like AND mixed
+    with OR or operators the builder doesn't have, the line is kept as written
+    and the boxes just get the closest thing parse_dork() could find.
+    """
+    line = line.strip()
+    wanted = canonical_query(line)
+    if not wanted:
+        return None
+    query_parts = parse_dork(line)
+    display_text = put_the_query_together(query_parts)
+    if canonical_query(display_text) != wanted:
+        display_text = line
+    return display_text, query_parts
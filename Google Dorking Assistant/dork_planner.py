@@ -0,0 +1,229 @@
+"""
+splits a query that's too long for the search engine into as few queries as
+possible that still cover every combination. google quietly ignores anything
+past its word limit, so a 500 item OR list in one query gives wrong results.
+
+each OR list gets packed into chunks (first fit decreasing bin packing) and
+the chunk sizes for all the fields are picked together so the number of
+queries (chunks in field A x chunks in field B x ...) is as small as it can
+be while the biggest query still fits the budget.
+"""
+import itertools
+
+from dork_compiler import FIELD_ORDER, field_fragment, put_the_query_together, quote_part, split_commas
+
+# google's documented word limit
+DEFAULT_MAX_TERMS = 32
+# roughly where long search urls start getting cut off
+DEFAULT_MAX_LENGTH = 2048
+
+
+def count_terms(query):
+    """how many words the engine sees in a query, ORs included"""
+    return len(query.split())
+
+
+def _items(value):
+    """the separate OR bits of a field, without blanks or repeats"""
+    seen = {}
+    for part in split_commas(value):
+        part = part.strip()
+        if part:
+            seen.setdefault(part, None)
+    return list(seen)
+
+
+def _words(item):
+    return len(quote_part(item).split())
+
+
+def pack(items, capacity):
+    """
+    first fit decreasing: puts items into as few chunks as it can where each
+    chunk's fragment is at most `capacity` words. a chunk of n items costs its
+    words plus n - 1 ORs, so every item costs words + 1 against capacity + 1.
+    gives back None if one item is too big on its own.
+    """
+    costs = {item: _words(item) + 1 for item in items}
+    return _pack(items, costs, capacity)
+
+
+def _pack(items, costs, capacity):
+    chunks = []
+    room = []
+    for item in sorted(items, key=costs.__getitem__, reverse=True):
+        cost = costs[item]
+        if cost > capacity + 1:
+            return None
+        for number, left in enumerate(room):
+            if cost <= left:
+                chunks[number].append(item)
+                room[number] -= cost
+                break
+        else:
+            chunks.append([item])
+            room.append(capacity + 1 - cost)
+    # put each chunk back in the order the user typed things
+    order = {item: number for number, item in enumerate(items)}
+    chunks = [sorted(chunk, key=order.__getitem__) for chunk in chunks]
+    chunks.sort(key=lambda chunk: order[chunk[0]])
+    return chunks
+
+
+def _fragment_words(key, chunk):
+    return count_terms(field_fragment(key, ", ".join(chunk)))
+
+
+class QueryPlan:
+    """what the planner decided: the chunks for every field and the queries they make"""
+
+    def __init__(self, parts, chunks, max_terms, max_length):
+        self.parts = parts
+        # key -> list of chunks (lists of items), only for fields that have something
+        self.chunks = chunks
+        self.max_terms = max_terms
+        self.max_length = max_length
+
+    def __len__(self):
+        total = 1
+        for field_chunks in self.chunks.values():
+            total *= len(field_chunks)
+        return total
+
+    def iter_parts(self):
+        """every query_parts dict in the plan, without making them all at once"""
+        keys = [key for key in FIELD_ORDER if key in self.chunks]
+        for combo in itertools.product(*(self.chunks[key] for key in keys)):
+            parts = dict.fromkeys(FIELD_ORDER, "")
+            for key, chunk in zip(keys, combo):
+                parts[key] = ", ".join(chunk)
+            yield parts
+
+    def iter_queries(self):
+        for parts in self.iter_parts():
+            yield put_the_query_together(parts)
+
+    def worst_case(self):
+        """(words, characters) of the biggest query the plan can make"""
+        words = 0
+        length = -1
+        for key, field_chunks in self.chunks.items():
+            words += max(_fragment_words(key, chunk) for chunk in field_chunks)
+            length += 1 + max(len(field_fragment(key, ", ".join(chunk))) for chunk in field_chunks)
+        return words, max(length, 0)
+
+    def report(self):
+        """a few lines saying how the query got split up"""
+        words, length = self.worst_case()
+        lines = [f"{len(self)} quer{'y' if len(self) == 1 else 'ies'} "
+                 f"(limit {self.max_terms} words / {self.max_length} chars, "
+                 f"biggest is {words} words / {length} chars)"]
+        for key in FIELD_ORDER:
+            if key in self.chunks:
+                field_chunks = self.chunks[key]
+                items = sum(len(chunk) for chunk in field_chunks)
+                lines.append(f"  {key}: {items} item(s) in {len(field_chunks)} chunk(s)")
+        return "\n".join(lines)
+
+
+def plan_queries(parts, max_terms=DEFAULT_MAX_TERMS, max_length=DEFAULT_MAX_LENGTH):
+    """
+    works out the smallest set of queries that covers everything in parts with
+    each query under max_terms words and max_length characters. raises
+    ValueError if that can't be done (like the exclusions alone being too long).
+    """
+    fixed = {}
+    splittable = {}
+    for key in FIELD_ORDER:
+        value = parts.get(key, "")
+        if not value:
+            continue
+        if key == "exclude_keywords":
+            # every query needs every exclusion, so these can't be split
+            fixed[key] = [[value]]
+            continue
+        items = _items(value)
+        if len(items) > 1:
+            splittable[key] = items
+        elif items:
+            fixed[key] = [items]
+
+    fixed_words = sum(count_terms(field_fragment(key, ", ".join(chunks[0])))
+                      for key, chunks in fixed.items())
+    budget = max_terms - fixed_words
+    if budget < len(splittable):
+        raise ValueError(f"the parts that can't be split already use {fixed_words} of {max_terms} words")
+
+    def plan_for(words):
+        chunks = _best_split(splittable, words)
+        if chunks is None:
+            return None
+        merged = dict(fixed, **chunks)
+        merged = {key: merged[key] for key in FIELD_ORDER if key in merged}
+        return QueryPlan(parts, merged, max_terms, max_length)
+
+    plan = plan_for(budget)
+    if plan is None:
+        raise ValueError(f"an OR item is too long to fit in {max_terms} words")
+    if plan.worst_case()[1] <= max_length:
+        return plan
+
+    # fits on words but not on characters, so find the most word room that
+    # still keeps the biggest query short enough
+    low, high = len(splittable), budget - 1
+    best = None
+    while low <= high:
+        middle = (low + high) // 2
+        candidate = plan_for(middle)
+        if candidate is not None and candidate.worst_case()[1] <= max_length:
+            best = candidate
+            low = middle + 1
+        else:
+            high = middle - 1
+    if best is None:
+        raise ValueError(f"can't get the queries under {max_length} characters")
+    return best
+
+
+def _best_split(splittable, budget):
+    """
+    picks a word capacity for every splittable field so the capacities add up
+    to at most budget and the product of chunk counts is as small as possible.
+    """
+    # for each field: [(capacity, chunks)] where more capacity means fewer chunks
+    options = {}
+    for key, items in splittable.items():
+        choices = []
+        best = None
+        costs = {item: _words(item) + 1 for item in items}
+        # past this much room everything fits in one chunk anyway
+        most = min(budget, sum(costs.values()) - 1)
+        for capacity in range(1, most + 1):
+            packed = _pack(items, costs, capacity)
+            if packed is None:
+                continue
+            if best is None or len(packed) < best:
+                best = len(packed)
+                choices.append((max(_fragment_words(key, chunk) for chunk in packed), packed))
+            if best == 1:
+                break
+        if not choices:
+            return None
+        options[key] = choices
+
+    # dp over fields: words used -> (fewest queries, chosen chunks)
+    table = {0: (1, {})}
+    for key, choices in options.items():
+        next_table = {}
+        for used, (count, picked) in table.items():
+            for words, packed in choices:
+                total = used + words
+                if total > budget:
+                    continue
+                new_count = count * len(packed)
+                if total not in next_table or new_count < next_table[total][0]:
+                    next_table[total] = (new_count, dict(picked, **{key: packed}))
+        table = next_table
+        if not table:
+            return None
+    return min(table.values(), key=lambda entry: entry[0])[1]
@@ -0,0 +1,182 @@
+"""
+opt-in timing for the hot paths, so when someone says the app hangs on their
+huge history we can see where the time went. it's off unless GDORK_PROFILE is
+set when the app starts:
+
+    GDORK_PROFILE=1 python GDork.py            prints the stats when it exits
+    GDORK_PROFILE=stats.json python GDork.py   writes them to stats.json
+    python dork_cli.py stats stats.json        shows a dumped file as a table
+
+when it's off, timed() hands back the function untouched, so it costs nothing.
+"""
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+PROFILE_ENV = "GDORK_PROFILE"
+# buckets are powers of two microseconds, up to about 35 minutes
+BUCKETS = 32
+
+
+class LatencyHistogram:
+    """counts timings in power of two buckets, so it stays tiny however many there are"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, seconds):
+        micros = int(seconds * 1e6)
+        self.buckets[min(micros.bit_length(), BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """roughly the timing (in ms) that fraction of calls came in under"""
+        if not self.count:
+            return 0.0
+        wanted = fraction * self.count
+        seen = 0
+        for bucket, hits in enumerate(self.buckets):
+            seen += hits
+            if seen >= wanted:
+                # the top of the bucket, but never past the slowest one we saw
+                return min((1 << bucket) / 1000, self.max * 1000)
+        return self.max * 1000
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(0.5), 3),
+            "p95_ms": round(self.percentile(0.95), 3),
+            "p99_ms": round(self.percentile(0.99), 3),
+            "max_ms": round(self.max * 1000, 3),
+            "buckets": self.buckets,
+        }
+
+
+class Profiler:
+    """a named LatencyHistogram for everything that gets timed, plus event loop stalls"""
+    # the slowest stalls we hang on to, with when they happened
+    KEEP_STALLS = 50
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.time()
+        self.histograms = {}
+        self.stalls = []
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.add(seconds)
+
+    def record_stall(self, seconds):
+        """the qt event loop didn't get a look in for this long"""
+        self.record("event_loop.stall", seconds)
+        with self._lock:
+            self.stalls.append((round(time.time() - self.started, 3), round(seconds * 1000, 1)))
+            if len(self.stalls) > self.KEEP_STALLS * 2:
+                self.stalls.sort(key=lambda stall: stall[1], reverse=True)
+                del self.stalls[self.KEEP_STALLS:]
+
+    def timed(self, name):
+        """decorator that records how long every call takes, if profiling is on"""
+        def wrap(function):
+            if not self.enabled:
+                return function
+
+            @functools.wraps(function)
+            def timed_call(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - started)
+            return timed_call
+        return wrap
+
+    def stats(self):
+        """everything recorded so far as a json-able dict"""
+        with self._lock:
+            stalls = sorted(self.stalls, key=lambda stall: stall[1], reverse=True)[:self.KEEP_STALLS]
+            return {
+                "pid": os.getpid(),
+                "seconds": round(time.time() - self.started, 3),
+                "timings": {name: histogram.summary()
+                            for name, histogram in sorted(self.histograms.items())},
+                "worst_stalls": [{"at_s": at, "ms": ms} for at, ms in stalls],
+            }
+
+    def short_summary(self, names):
+        """one line for the status bar: p95 of a few timings and the stall count"""
+        bits = []
+        with self._lock:
+            for name in names:
+                histogram = self.histograms.get(name)
+                if histogram is not None and histogram.count:
+                    bits.append(f"{name} p95 {histogram.percentile(0.95):.1f}ms")
+            stalls = self.histograms.get("event_loop.stall")
+            if stalls is not None:
+                bits.append(f"{stalls.count} stall(s), worst {stalls.max * 1000:.0f}ms")
+        return " | ".join(bits)
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.stats(), f, indent=2)
+            f.write("\n")
+
+    def checkpoint(self):
+        """writes the stats so far, if GDORK_PROFILE names a file (so a hang doesn't lose them)"""
+        where = os.environ.get(PROFILE_ENV)
+        if where and where not in ("1", "-") and self.histograms:
+            try:
+                self.dump(where)
+            except IOError:
+                pass
+
+    def report(self):
+        """
+        what happens at exit when GDORK_PROFILE is set: "1" or "-" prints the
+        stats, anything else is a file they get written to
+        """
+        where = os.environ.get(PROFILE_ENV)
+        if not where or not self.histograms:
+            return
+        if where in ("1", "-"):
+            print(format_stats(self.stats()), file=sys.stderr)
+            return
+        try:
+            self.dump(where)
+        except IOError as e:
+            print(f"could not write profile stats: {e}", file=sys.stderr)
+
+
+def format_stats(stats):
+    """a dumped stats dict as a little table"""
+    lines = [f"{'timing':<28}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"]
+    for name, timing in stats["timings"].items():
+        lines.append(f"{name:<28}{timing['count']:>8}" + "".join(
+            f"{timing[key]:>8.2f}ms" for key in ("mean_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms")))
+    if stats["worst_stalls"]:
+        worst = ", ".join(f"{stall['ms']:.0f}ms at {stall['at_s']:.1f}s" for stall in stats["worst_stalls"][:5])
+        lines.append(f"worst event loop stalls: {worst}")
+    return "\n".join(lines)
+
+
+PROFILER = Profiler(enabled=bool(os.environ.get(PROFILE_ENV)))
+if PROFILER.enabled:
+    atexit.register(PROFILER.report)
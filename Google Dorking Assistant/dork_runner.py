@@ -0,0 +1,276 @@
+"""
+sends lots of compiled queries to a search api endpoint at once with asyncio.
+connections are kept alive and reused, a token bucket keeps us under the rate
+limit, failed requests get retried with backoff, and every result is written
+to a jsonl file as soon as it comes back.
+
+the endpoint is anything that takes the query as a url parameter, e.g.
+http://127.0.0.1:8000/search gets called as /search?q=<url encoded query>.
+"""
+import asyncio
+import json
+import random
+import ssl
+import sys
+import time
+from urllib.parse import urlencode, urlsplit
+
+USER_AGENT = "google-dorking-assistant"
+
+
+class TokenBucket:
+    """lets through `rate` requests a second on average, with bursts up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError(f"the rate has to be more than 0 requests a second, not {rate}")
+        self.rate = float(rate)
+        self.capacity = float(burst if burst is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def take(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class HTTPError(Exception):
+    """the server answered, but not with something we'd call a result"""
+
+    def __init__(self, status, retry_after=None):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+        self.retry_after = retry_after
+
+
+class ConnectionPool:
+    """a handful of keep-alive HTTP/1.1 connections to one host"""
+
+    def __init__(self, base_url, size=8, timeout=30.0):
+        url = urlsplit(base_url)
+        if url.scheme not in ("http", "https"):
+            raise ValueError(f"endpoint has to be http or https, not {base_url!r}")
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if url.scheme == "https" else None
+        self.host_header = url.netloc
+        self.timeout = timeout
+        self._idle = []
+        self._slots = asyncio.Semaphore(size)
+
+    async def _connect(self):
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout)
+
+    async def get(self, target):
+        """does one GET and gives back (status, headers, body bytes)"""
+        async with self._slots:
+            reused = bool(self._idle)
+            reader, writer = self._idle.pop() if reused else await self._connect()
+            try:
+                status, headers, body, keep = await asyncio.wait_for(
+                    self._exchange(reader, writer, target), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if not reused:
+                    raise
+                # the server dropped an idle connection, try once on a fresh one
+                reader, writer = await self._connect()
+                try:
+                    status, headers, body, keep = await asyncio.wait_for(
+                        self._exchange(reader, writer, target), self.timeout)
+                except BaseException:
+                    writer.close()
+                    raise
+            except BaseException:
+                writer.close()
+                raise
+            if keep:
+                self._idle.append((reader, writer))
+            else:
+                writer.close()
+            return status, headers, body
+
+    async def _exchange(self, reader, writer, target):
+        writer.write((
+            f"GET {target} HTTP/1.1\r\n"
+            f"Host: {self.host_header}\r\n"
+            f"User-Agent: {USER_AGENT}\r\n"
+            "Accept: */*\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode("latin-1"))
+        await writer.drain()
+
+        status_line = await reader.readuntil(b"\r\n")
+        version, status = status_line.decode("latin-1").split(" ", 2)[:2]
+        headers = {}
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        status = int(status)
+        keep = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        if status < 200 or status in (204, 304):
+            # these never have a body, whatever the headers say
+            body = b""
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                if size == 0:
+                    # trailers, up to the blank line
+                    while await reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    break
+                body += await reader.readexactly(size)
+                await reader.readexactly(2)
+            body = bytes(body)
+        elif "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        else:
+            body = await reader.read()
+            keep = False
+        return status, headers, body, keep
+
+    def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+
+def search_target(endpoint, query, param="q"):
+    """the path and url-encoded query string for one search"""
+    url = urlsplit(endpoint)
+    path = url.path or "/"
+    extra = urlencode({param: query})
+    return f"{path}?{url.query}&{extra}" if url.query else f"{path}?{extra}"
+
+
+def _decode(body):
+    text = body.decode("utf-8", errors="replace")
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _retry_after(headers):
+    try:
+        return float(headers.get("retry-after", ""))
+    except ValueError:
+        return None
+
+
+async def fetch_one(pool, bucket, endpoint, query, param="q", retries=3, backoff=0.5):
+    """
+    runs one query, gives back the result record. only 2xx counts as a result.
+    429s, 5xxs and network trouble get retried; any other status (a 403 for
+    a used up quota, a 400 for a query that's too long) fails straight away,
+    with whatever the server said kept in the record.
+    """
+    target = search_target(endpoint, query, param)
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        await bucket.take()
+        try:
+            status, headers, body = await pool.get(target)
+            if status == 429 or status >= 500:
+                raise HTTPError(status, _retry_after(headers))
+            record = {"query": query, "status": status, "attempts": attempt + 1,
+                      "seconds": round(time.monotonic() - started, 4), "result": _decode(body)}
+            if not 200 <= status < 300:
+                record["error"] = str(HTTPError(status))
+            return record
+        except (HTTPError, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError) as e:
+            if attempt >= retries:
+                return {"query": query, "status": getattr(e, "status", None), "attempts": attempt + 1,
+                        "seconds": round(time.monotonic() - started, 4), "error": str(e) or type(e).__name__}
+            delay = getattr(e, "retry_after", None)
+            if delay is None:
+                # exponential backoff with a bit of jitter so retries don't line up
+                delay = backoff * (2 ** attempt) * (0.5 + random.random())
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+async def run_queries(queries, endpoint, out_path, concurrency=16, rate=5.0, burst=None,
+                      retries=3, backoff=0.5, param="q", timeout=30.0, cache=None):
+    """
+    runs every query against the endpoint and appends one json line per
+    result to out_path, in the order they finish. queries can be a generator;
+    only a few of them are ever waiting in memory. if a ResultCache is given,
+    fresh cached results are used instead of going to the network and new
+    2xx ones get stored (the cache is sqlite, so it's used from a thread to
+    keep its disk writes out of the event loop). gives back (ok, failed). if a worker blows up (say the
+    cache can't be written) the whole run stops with that error.
+    """
+    pool = ConnectionPool(endpoint, size=concurrency, timeout=timeout)
+    bucket = TokenBucket(rate, burst)
+    waiting = asyncio.Queue(maxsize=concurrency * 2)
+    counts = {"ok": 0, "failed": 0}
+
+    with open(out_path, "a", encoding="utf-8") as out:
+        async def worker():
+            while True:
+                query = await waiting.get()
+                if query is None:
+                    return
+                cached = await asyncio.to_thread(cache.get, query) if cache is not None else None
+                # older versions could have cached an error page, don't hand those out
+                if cached is not None and 200 <= cached["status"] < 300:
+                    record = {"query": query, "status": cached["status"], "attempts": 0,
+                              "seconds": 0.0, "cached": True, "result": cached["result"]}
+                else:
+                    record = await fetch_one(pool, bucket, endpoint, query, param, retries, backoff)
+                    if cache is not None and "error" not in record and 200 <= record["status"] < 300:
+                        await asyncio.to_thread(
+                            cache.put, query, {"status": record["status"], "result": record["result"]})
+                counts["failed" if "error" in record else "ok"] += 1
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+
+        async def feed():
+            for query in queries:
+                query = query.strip()
+                if query:
+                    await waiting.put(query)
+            for _ in range(concurrency):
+                await waiting.put(None)
+
+        # the feeder runs as a task too, so a worker dying (and leaving the
+        # queue full) ends the gather instead of leaving feed() stuck on put
+        tasks = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        tasks.append(asyncio.create_task(feed()))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            pool.close()
+    return counts["ok"], counts["failed"]
+
+
+def run_queries_to_file(queries, endpoint, out_path, **options):
+    """the same as run_queries, for code that isn't async"""
+    return asyncio.run(run_queries(queries, endpoint, out_path, **options))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4:
+        print("usage: python dork_runner.py ENDPOINT QUERIES.txt RESULTS.jsonl")
+        sys.exit(2)
+    with open(sys.argv[2], "r", encoding="utf-8") as f:
+        ok, failed = run_queries_to_file(f, sys.argv[1], sys.argv[3])
+    print(f"{ok} ok, {failed} failed, results in {sys.argv[3]}")
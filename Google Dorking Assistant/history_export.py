@@ -0,0 +1,102 @@
+"""
+writes the history out to a file one entry at a time, straight from the
+history store. works as txt (just the queries), jsonl (with query_parts) or
+csv, each of them optionally gzip or zstd compressed. the format comes from
+the file name, like dorks.jsonl.gz or dorks.csv.zst.
+"""
+import csv
+import gzip
+import io
+import json
+import os
+
+from dork_compiler import FIELD_ORDER
+
+FORMATS = ("txt", "jsonl", "csv")
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+
+
+class ExportCancelled(Exception):
+    """the export got stopped before it finished"""
+
+
+def detect_format(path):
+    """works out (format, compression) from a file name, e.g. ("csv", "gzip")"""
+    name = path.lower()
+    compression = None
+    for ending, kind in COMPRESSIONS.items():
+        if name.endswith(ending):
+            compression = kind
+            name = name[:-len(ending)]
+    fmt = os.path.splitext(name)[1].lstrip(".")
+    if fmt not in FORMATS:
+        fmt = "txt"
+    return fmt, compression
+
+
+def _open_output(path, compression):
+    if compression == "gzip":
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd export needs the zstandard package (pip install zstandard)")
+        raw = open(path, "wb")
+        writer = zstandard.ZstdCompressor().stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(writer, encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+def export_history(store, path, fmt=None, compression=None, progress=None,
+                   cancelled=None, every=5000):
+    """
+    writes every history entry to path and gives back how many went out.
+    progress(done, total) gets called every `every` entries, and if
+    cancelled() ever says True we stop, delete the half-made file and raise
+    ExportCancelled. the file is written under a temp name and swapped in at
+    the end, so a failed export never leaves half a file where you asked.
+    """
+    guessed_fmt, guessed_compression = detect_format(path)
+    fmt = fmt or guessed_fmt
+    compression = compression if compression is not None else guessed_compression
+    if fmt not in FORMATS:
+        raise ValueError(f"don't know how to export {fmt!r}, try one of {', '.join(FORMATS)}")
+
+    # just the ids up front, each entry gets looked up as we go
+    ids = store.ids()
+    total = len(ids)
+    temp_path = path + ".part"
+    done = 0
+    try:
+        with _open_output(temp_path, compression) as out:
+            if fmt == "csv":
+                writer = csv.writer(out)
+                writer.writerow(("id", "display_text") + FIELD_ORDER)
+            for entry_id in ids:
+                entry = store.get(entry_id)
+                if entry is None:
+                    # deleted while we were exporting
+                    continue
+                if fmt == "txt":
+                    out.write(entry["display_text"] + "\n")
+                elif fmt == "jsonl":
+                    out.write(json.dumps({"id": entry_id, **entry}) + "\n")
+                else:
+                    parts = entry["query_parts"]
+                    writer.writerow((entry_id, entry["display_text"])
+                                    + tuple(parts.get(key, "") for key in FIELD_ORDER))
+                done += 1
+                if done % every == 0:
+                    if cancelled is not None and cancelled():
+                        raise ExportCancelled()
+                    if progress is not None:
+                        progress(done, total)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if progress is not None:
+        progress(done, total)
+    return done
@@ -0,0 +1,99 @@
+"""
+groups the history by target for the "By Site" tree: first by the site field,
+then by filetype (or the first other operator the query uses). the groups are
+kept up to date one entry at a time as things get saved and deleted, so the
+counts are always right without ever walking the whole history again.
+"""
+import threading
+
+from dork_compiler import operator_prefix
+
+NO_SITE = "(no site)"
+KEYWORDS_ONLY = "(keywords only)"
+# what a query without a filetype gets grouped under, first one it has wins
+SUBGROUP_FIELDS = ("in_url", "in_title", "in_text", "related", "cache")
+
+
+def _tidy(value):
+    return " ".join(value.split()).lower()
+
+
+def group_keys(entry):
+    """the (site, subgroup) a history entry gets filed under"""
+    fields = dict(entry.fields())
+    site = _tidy(fields.get("site", "")) or NO_SITE
+    filetype = _tidy(fields.get("filetype", ""))
+    if filetype:
+        return site, operator_prefix("filetype") + filetype
+    for key in SUBGROUP_FIELDS:
+        if fields.get(key):
+            return site, operator_prefix(key)
+    return site, KEYWORDS_ONLY
+
+
+class HistoryGroups:
+    """
+    site -> subgroup -> ids for a HistoryStore, in the order things were first
+    saved. hook it up with store.add_listener(groups.on_change) before loading.
+    once start_recording() is called every change is also noted down, so the
+    tree model can catch up on just those later with take_changes().
+    """
+
+    def __init__(self, store):
+        self.store = store
+        # site -> {subgroup -> {id: None}}, dicts so the order stays put
+        self.sites = {}
+        # site -> how many entries it has in all its subgroups
+        self.counts = {}
+        self._changes = None
+        self._lock = threading.Lock()
+
+    def on_change(self, action, entry_id, entry):
+        site, subgroup = group_keys(entry)
+        # for a delete: 1 if that emptied the subgroup, 2 if the whole site
+        emptied = 0
+        if action == "add":
+            subgroups = self.sites.get(site)
+            if subgroups is None:
+                subgroups = self.sites[site] = {}
+                self.counts[site] = 0
+            subgroups.setdefault(subgroup, {})[entry_id] = None
+            self.counts[site] += 1
+        elif action == "del":
+            subgroups = self.sites.get(site)
+            ids = subgroups.get(subgroup) if subgroups is not None else None
+            if ids is None or entry_id not in ids:
+                return
+            del ids[entry_id]
+            self.counts[site] -= 1
+            if not ids:
+                del subgroups[subgroup]
+                emptied = 1
+            if not subgroups:
+                del self.sites[site]
+                del self.counts[site]
+                emptied = 2
+        else:
+            return
+        with self._lock:
+            if self._changes is not None:
+                self._changes.append((action, entry_id, site, subgroup, emptied))
+
+    def start_recording(self):
+        """starts (or starts over) noting down changes for take_changes()"""
+        with self._lock:
+            self._changes = []
+
+    def take_changes(self):
+        """(action, id, site, subgroup, emptied) for everything since the last call"""
+        with self._lock:
+            changes = self._changes or []
+            if self._changes is not None:
+                self._changes = []
+        return changes
+
+    def subgroups(self, site):
+        return self.sites.get(site, {})
+
+    def ids(self, site, subgroup):
+        return self.sites.get(site, {}).get(subgroup, {})
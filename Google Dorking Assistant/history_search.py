@@ -0,0 +1,359 @@
+"""
+a search index over the history so filtering doesn't have to look at every
+entry on every keystroke. words in the queries point at the entries that have
+them, and operators like site:example.com or filetype:pdf get their own lookup.
+typing part of a word works too: every word (and field value) is also filed
+under its trigrams, so "dmi" only has to look at the words with "dmi" in them.
+"""
+import re
+from bisect import bisect_left
+
+from dork_compiler import split_commas
+
+# search bar operators -> the query_parts key they look in
+SEARCH_OPERATORS = {
+    "site": "site", "intitle": "in_title", "inurl": "in_url", "intext": "in_text",
+    "related": "related", "cache": "cache", "filetype": "filetype",
+}
+
+_WORDS = re.compile(r"[a-z0-9]+")
+# how long the pieces of text are that words get filed under
+GRAM = 3
+_OPERATOR_TERMS = re.compile(r"\b(" + "|".join(SEARCH_OPERATORS) + r"):(\"[^\"]*\"|\S*)", re.IGNORECASE)
+
+
+def _field_values(value):
+    """the separate OR bits of a field, lowercased and without quotes"""
+    return {part.strip().strip('"').lower() for part in split_commas(value) if part.strip()}
+
+
+def _trigrams(text):
+    return {text[start:start + GRAM] for start in range(len(text) - GRAM + 1)}
+
+
+def _add_id(ids, entry_id):
+    """
+    files an id into a posting: a plain int while there's only one, a sorted
+    list after that. a set per term was most of what the index weighed.
+    gives back the posting to keep.
+    """
+    if ids is None:
+        return entry_id
+    if isinstance(ids, int):
+        if ids == entry_id:
+            return ids
+        return sorted((ids, entry_id))
+    if entry_id > ids[-1]:
+        # ids only ever go up, so this is nearly always where it goes
+        ids.append(entry_id)
+        return ids
+    position = bisect_left(ids, entry_id)
+    if ids[position] != entry_id:
+        ids.insert(position, entry_id)
+    return ids
+
+
+def _drop_id(ids, entry_id):
+    """takes an id out of a posting, gives back what's left (None if nothing)"""
+    if isinstance(ids, int):
+        return None if ids == entry_id else ids
+    position = bisect_left(ids, entry_id)
+    if position < len(ids) and ids[position] == entry_id:
+        del ids[position]
+    return ids[0] if len(ids) == 1 else ids
+
+
+class _SubstringIndex:
+    """
+    term -> ids, plus trigram -> the terms that have it, so finding the terms
+    containing some text only looks at the ones sharing its rarest trigram
+    instead of every term there is. terms too short to have a trigram are
+    kept to one side, there aren't many of those.
+    """
+
+    def __init__(self):
+        # term -> an id, or a sorted list of them (see _add_id)
+        self.ids = {}
+        # trigram -> list of terms, lists are a lot smaller than sets
+        self._grams = {}
+        self._short = set()
+
+    def add(self, term, entry_id):
+        ids = self.ids.get(term)
+        if ids is None:
+            grams = _trigrams(term)
+            if not grams:
+                self._short.add(term)
+            for gram in grams:
+                terms = self._grams.get(gram)
+                if terms is None:
+                    self._grams[gram] = [term]
+                else:
+                    terms.append(term)
+        self.ids[term] = _add_id(ids, entry_id)
+
+    def discard(self, term, entry_id):
+        ids = self.ids.get(term)
+        if ids is None:
+            return
+        ids = _drop_id(ids, entry_id)
+        if ids is not None:
+            self.ids[term] = ids
+            return
+        del self.ids[term]
+        self._short.discard(term)
+        for gram in _trigrams(term):
+            terms = self._grams[gram]
+            terms.remove(term)
+            if not terms:
+                del self._grams[gram]
+
+    def terms_containing(self, text):
+        if len(text) >= GRAM:
+            pieces = []
+            for gram in _trigrams(text):
+                terms = self._grams.get(gram)
+                if not terms:
+                    return ()
+                pieces.append(terms)
+            rarest = min(pieces, key=len)
+            return rarest if len(text) == GRAM else [term for term in rarest if text in term]
+        # shorter than a trigram: the terms under every trigram it's part of
+        found = {term for term in self._short if text in term}
+        for gram, terms in self._grams.items():
+            if text in gram:
+                found.update(terms)
+        return found
+
+    def ids_containing(self, text):
+        """every id filed under a term with this text somewhere in it"""
+        found = set()
+        for term in self.terms_containing(text):
+            ids = self.ids[term]
+            if isinstance(ids, int):
+                found.add(ids)
+            else:
+                found.update(ids)
+        return found
+
+
+class _Texts:
+    """
+    every entry's lowercased display text, to check the typed text against.
+    the store doesn't keep the text and compiling it again on each keystroke
+    is too slow. they're kept in a list in id order next to a list of the ids,
+    which is a good bit smaller than a dict of them. a deleted entry's text
+    becomes GONE until half of them are, then the lists get tidied up.
+    """
+    # a newline can't be in a display text or typed into the search bar, so
+    # nothing ever matches this
+    GONE = "\n"
+
+    def __init__(self):
+        self._ids = []
+        self._texts = []
+        self._gone = 0
+
+    def _position(self, entry_id):
+        position = bisect_left(self._ids, entry_id)
+        if position < len(self._ids) and self._ids[position] == entry_id:
+            return position
+        return None
+
+    def add(self, entry_id, text):
+        text = text.replace("\n", " ")
+        if not self._ids or entry_id > self._ids[-1]:
+            # ids only ever go up, so this is nearly always where it goes
+            self._ids.append(entry_id)
+            self._texts.append(text)
+            return
+        position = bisect_left(self._ids, entry_id)
+        if position < len(self._ids) and self._ids[position] == entry_id:
+            if self._texts[position] is self.GONE:
+                self._gone -= 1
+            self._texts[position] = text
+            return
+        self._ids.insert(position, entry_id)
+        self._texts.insert(position, text)
+
+    def get(self, entry_id):
+        position = self._position(entry_id)
+        if position is None or self._texts[position] is self.GONE:
+            return None
+        return self._texts[position]
+
+    def pop(self, entry_id):
+        """takes an entry's text out, gives it back (None if it wasn't here)"""
+        text = self.get(entry_id)
+        if text is None:
+            return None
+        self._texts[self._position(entry_id)] = self.GONE
+        self._gone += 1
+        if self._gone * 2 > len(self._ids):
+            kept = [(kept_id, kept_text) for kept_id, kept_text in zip(self._ids, self._texts)
+                    if kept_text is not self.GONE]
+            self._ids = [kept_id for kept_id, _ in kept]
+            self._texts = [kept_text for _, kept_text in kept]
+            self._gone = 0
+        return text
+
+    def having(self, plain, ids=None):
+        """
+        the ids whose text has plain in it, in id order. looks through
+        everything, or just ids if it's given (a set, or a list in id order).
+        """
+        if ids is None:
+            if not plain:
+                return [entry_id for entry_id, text in zip(self._ids, self._texts)
+                        if text is not self.GONE]
+            return [entry_id for entry_id, text in zip(self._ids, self._texts) if plain in text]
+        if not plain:
+            # the index only hands out ids that are still here
+            return sorted(ids) if isinstance(ids, set) else list(ids)
+        if len(ids) * 2 < len(self._ids):
+            # look each one up. the index only hands out ids that are here,
+            # so bisecting always lands right on one
+            texts, all_ids = self._texts, self._ids
+            return [entry_id for entry_id in (sorted(ids) if isinstance(ids, set) else ids)
+                    if plain in texts[bisect_left(all_ids, entry_id)]]
+        wanted = ids if isinstance(ids, set) else set(ids)
+        return [entry_id for entry_id, text in zip(self._ids, self._texts)
+                if plain in text and entry_id in wanted]
+
+
+def split_search(search_text):
+    """
+    pulls the operator filters out of what was typed in the search bar.
+    gives back (plain text, ((key, value), ...)).
+    """
+    operators = []
+    for name, value in _OPERATOR_TERMS.findall(search_text):
+        operators.append((SEARCH_OPERATORS[name.lower()], value.strip('"').lower()))
+    plain = _OPERATOR_TERMS.sub(" ", search_text)
+    return " ".join(plain.split()).lower(), tuple(sorted(operators))
+
+
+class HistoryIndex:
+    """
+    keeps word -> ids and field value -> ids lookups for a HistoryStore.
+    hook it up with store.add_listener(index.on_change) before loading the
+    store and it keeps itself up to date from there.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._words = _SubstringIndex()
+        # query_parts key -> a _SubstringIndex of that field's values
+        self._fields = {key: _SubstringIndex() for key in set(SEARCH_OPERATORS.values())}
+        # query_parts key -> the ids that have something in that field (a posting)
+        self._with_field = dict.fromkeys(self._fields)
+        self._texts = _Texts()
+        # (plain text, operators, ids) from the last search, for narrowing
+        self._last = None
+
+    def on_change(self, action, entry_id, entry):
+        if action == "add":
+            self._add(entry_id, entry)
+        elif action == "del":
+            self._remove(entry_id, entry)
+        self._last = None
+
+    def _keys_for(self, entry, text):
+        words = set(_WORDS.findall(text))
+        fields = [(key, _field_values(value)) for key, value in entry.fields() if key in self._fields]
+        return words, fields
+
+    def _add(self, entry_id, entry):
+        text = entry.display_text.lower()
+        self._texts.add(entry_id, text)
+        words, fields = self._keys_for(entry, text)
+        for word in words:
+            self._words.add(word, entry_id)
+        for key, values in fields:
+            self._with_field[key] = _add_id(self._with_field[key], entry_id)
+            for value in values:
+                self._fields[key].add(value, entry_id)
+
+    def _remove(self, entry_id, entry):
+        text = self._texts.pop(entry_id)
+        words, fields = self._keys_for(entry, entry.display_text.lower() if text is None else text)
+        for word in words:
+            self._words.discard(word, entry_id)
+        for key, values in fields:
+            if self._with_field[key] is not None:
+                self._with_field[key] = _drop_id(self._with_field[key], entry_id)
+            for value in values:
+                self._fields[key].discard(value, entry_id)
+
+    def _ids_with_word(self, word):
+        """every entry that has a word containing this bit of text"""
+        return self._words.ids_containing(word)
+
+    def _ids_with_field(self, key, value):
+        """every entry where that field has a value containing this bit of text"""
+        if not value:
+            ids = self._with_field[key]
+            if ids is None:
+                return set()
+            return {ids} if isinstance(ids, int) else set(ids)
+        return self._fields[key].ids_containing(value)
+
+    def _verify(self, ids, plain):
+        """keeps the ids whose text really has the typed text in it"""
+        return self._texts.having(plain, ids)
+
+    def search(self, search_text):
+        """gives back the ids that match the search, in the order they were saved"""
+        plain, operators = split_search(search_text)
+        # one whole word is found exactly by the word lookup: letters and
+        # digits can only ever match inside one word. anything else (spaces,
+        # dots, a letter or two) gets checked against the text at the end
+        exact = len(plain) >= GRAM and _WORDS.fullmatch(plain) is not None
+        last = self._last
+        if last is not None and last[1] == operators and last[0] in plain and not exact:
+            # still typing the same thing, so only look in what matched before
+            ids = self._verify(last[2], plain)
+            self._last = (plain, operators, ids)
+            return ids
+
+        candidates = None
+        for key, value in operators:
+            ids = self._ids_with_field(key, value)
+            candidates = set(ids) if candidates is None else candidates & ids
+        for word in set(_WORDS.findall(plain)):
+            if len(word) < GRAM:
+                # a letter or two is in nearly everything, not worth looking
+                # up; checking the text catches it anyway
+                continue
+            if candidates is not None and not candidates:
+                break
+            ids = self._ids_with_word(word)
+            candidates = ids if candidates is None else candidates & ids
+
+        if candidates is None:
+            # nothing we can look up (empty search or only symbols)
+            ids = self._texts.having(plain)
+        elif exact:
+            # ids only ever go up, so sorting them puts them back in save order
+            ids = sorted(candidates)
+        else:
+            ids = self._verify(candidates, plain)
+        self._last = (plain, operators, ids)
+        return ids
+
+    def matches(self, search_text, entry_id):
+        """checks if one entry would show up for this search"""
+        entry = self.store.get(entry_id)
+        text = self._texts.get(entry_id)
+        if entry is None or text is None:
+            return False
+        plain, operators = split_search(search_text)
+        if plain not in text:
+            return False
+        for key, value in operators:
+            field_value = entry["query_parts"].get(key, "")
+            if not field_value:
+                return False
+            if not any(value in part for part in _field_values(field_value)):
+                return False
+        return True
@@ -0,0 +1,643 @@
+"""
+the saved query history, kept as an append-only journal (one json record per
+line) instead of re-dumping the whole list on every change. saving or deleting
+just adds one line to the end, and the journal gets squashed down in a
+background thread once it's mostly dead records. more than one process can
+share a journal: writes take a file lock, and everyone picks up the others'
+records from where they last read instead of loading the whole thing again.
+"""
+import json
+import os
+import sys
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    # windows
+    fcntl = None
+    import msvcrt
+
+from dork_compiler import FIELD_ORDER, field_fragment
+from dork_profiler import PROFILER
+
+# where the history lives unless told otherwise
+DEFAULT_HISTORY_FILE = "history.jsonl"
+# the old whole-list history file, brought over the first time we run
+OLD_HISTORY_FILE = "history.json"
+# set this to point every window and cli job at one shared history
+HISTORY_ENV = "GDORK_HISTORY"
+# fields whose values repeat a lot across the history (the same few targets
+# and filetypes), so every record can share one copy of each value
+INTERNED_FIELDS = frozenset(("site", "filetype", "in_url", "in_title", "in_text", "related", "cache"))
+# (bit, key, interned?) for every builder box
+_FIELD_BITS = tuple((1 << bit, key, key in INTERNED_FIELDS) for bit, key in enumerate(FIELD_ORDER))
+# bitmask of filled in boxes -> the keys of those boxes, worked out once
+_KEYS_FOR_MASK = tuple(tuple(key for bit, key in enumerate(FIELD_ORDER) if mask >> bit & 1)
+                       for mask in range(1 << len(FIELD_ORDER)))
+
+
+def history_path(default=DEFAULT_HISTORY_FILE):
+    """the full path of the history journal: $GDORK_HISTORY, or else default"""
+    return os.path.abspath(os.environ.get(HISTORY_ENV) or default)
+
+
+def normalize_query(query):
+    """the form we compare queries in when looking for duplicates"""
+    return " ".join(query.split()).lower()
+
+
+class HistoryRecord:
+    """
+    one saved query, kept small. only the builder boxes that have something in
+    them are stored (a bitmask says which), repeated values like sites and
+    filetypes are interned, and the display text gets compiled when it's asked
+    for. the text is only kept when it's not what the boxes compile to, like
+    entries from an older version. still reads like the old dict, so
+    record["display_text"] and record["query_parts"] keep working.
+    """
+    __slots__ = ("_mask", "_values", "_text")
+
+    def __init__(self, display_text, query_parts):
+        mask = 0
+        values = []
+        for bit, key, interned in _FIELD_BITS:
+            value = query_parts.get(key)
+            if value:
+                mask |= bit
+                values.append(sys.intern(value) if interned else value)
+        self._mask = mask
+        self._values = tuple(values)
+        self._text = None
+        if display_text != self._compile():
+            self._text = display_text
+
+    def fields(self):
+        """(key, value) for just the boxes that aren't empty, in FIELD_ORDER"""
+        return zip(_KEYS_FOR_MASK[self._mask], self._values)
+
+    def _compile(self):
+        """the same as put_the_query_together(self.query_parts), just quicker"""
+        fragments = list(map(field_fragment, _KEYS_FOR_MASK[self._mask], self._values))
+        if self._mask & 2:
+            # exclusions are second in FIELD_ORDER but go on the end of the query
+            fragments.append(fragments.pop(self._mask & 1))
+        return " ".join(filter(None, fragments))
+
+    @property
+    def display_text(self):
+        return self._text if self._text is not None else self._compile()
+
+    @property
+    def query_parts(self):
+        """all the builder boxes, empty ones included, as a new dict"""
+        parts = dict.fromkeys(FIELD_ORDER, "")
+        parts.update(self.fields())
+        return parts
+
+    def keys(self):
+        return ("display_text", "query_parts")
+
+    def __getitem__(self, key):
+        if key == "display_text":
+            return self.display_text
+        if key == "query_parts":
+            return self.query_parts
+        raise KeyError(key)
+
+    def __repr__(self):
+        return f"HistoryRecord({self.display_text!r})"
+
+
+class JournalLock:
+    """
+    an exclusive lock on a little side file (history.jsonl.lock), so every
+    window and cli job using the same history takes turns writing to it. the
+    thread holding it can take it again, the store's own lock makes sure only
+    one of its threads ever tries.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._depth = 0
+
+    def __enter__(self):
+        if self._depth == 0:
+            lock_file = open(self.path, "a+b")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                else:
+                    lock_file.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            # LK_LOCK gives up after 10 seconds, just keep waiting
+                            pass
+            except BaseException:
+                lock_file.close()
+                raise
+            self._file = lock_file
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            if fcntl is None:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            # closing it lets go of the flock
+            self._file.close()
+            self._file = None
+
+
+def _file_id(stat_result):
+    """tells files apart even when one gets swapped in under the same name"""
+    return stat_result.st_dev, stat_result.st_ino
+
+
+class HistoryStore:
+    """
+    history entries live in memory as {id: HistoryRecord} and every change
+    gets appended to the journal file as one record:
+        {"op": "add", "id": 3, "display_text": "...", "query_parts": {...}}
+        {"op": "del", "ids": [3, 7]}
+
+    several windows and cli jobs can share one journal. writes happen under a
+    JournalLock, and before each one the store reads whatever the others
+    appended since it last looked, so ids never clash. sync() does the same
+    catching up on demand and says what changed.
+
+    with read_only the store only ever reads (for things like listing the
+    history): load() doesn't make a journal, lock file or legacy import if
+    there isn't one, saving raises IOError and sync() never finds anything.
+    """
+    # squash the journal once dead records outnumber live ones (and there's a few)
+    COMPACT_AFTER = 1000
+    # how often load() reports how far it's got
+    PROGRESS_EVERY = 20000
+
+    def __init__(self, path, legacy_path=None, read_only=False):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.read_only = read_only
+        self._entries = {}
+        # hash of the normalized query -> id, so duplicate checks don't walk the
+        # whole history (and we don't keep a second copy of every query around).
+        # a set of ids when there's more than one, like "Admin" and "admin"
+        # saved by versions that compared the exact text, or a hash clash
+        self._by_query = {}
+        self._next_id = 1
+        self._dead = 0
+        self._lock = threading.RLock()
+        self._file_lock = JournalLock(path + ".lock")
+        self._file = None
+        # how far into the journal we've read, and which file that was
+        self._offset = 0
+        self._file_id = None
+        # ("add" or "del", id) for changes other processes made that sync()
+        # hasn't handed out yet
+        self._unsynced = []
+        self._compacting = False
+        self._compactor = None
+        # things that want to hear about every add/del, like the search index
+        self._listeners = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, entry_id):
+        return entry_id in self._entries
+
+    def add_listener(self, listener):
+        """listener(action, entry_id, entry) gets called for every "add" and "del" """
+        self._listeners.append(listener)
+
+    def get(self, entry_id):
+        return self._entries.get(entry_id)
+
+    def find(self, query):
+        """gives back the id of a saved query that matches this one, or None"""
+        key = normalize_query(query)
+        ids = self._by_query.get(hash(key))
+        if ids is None:
+            return None
+        for entry_id in (ids,) if isinstance(ids, int) else sorted(ids):
+            if normalize_query(self._entries[entry_id].display_text) == key:
+                return entry_id
+        return None
+
+    def ids(self):
+        """just the entry ids, in the order they were saved"""
+        with self._lock:
+            return list(self._entries)
+
+    def items(self):
+        """(id, entry) pairs in the order they were saved"""
+        with self._lock:
+            return list(self._entries.items())
+
+    @PROFILER.timed("store.load")
+    def load(self, progress=None):
+        """
+        reads the journal back in, or brings over an old history.json.
+        progress(count) gets called every PROGRESS_EVERY records if it's given.
+        the bulk of the reading happens without the file lock, so other
+        windows can go on saving while a big history loads; the lock is only
+        taken at the end to pick up what they saved meanwhile.
+        """
+        with self._lock:
+            if self.read_only:
+                if os.path.exists(self.path):
+                    # a save that's half written right now just gets left out
+                    self._replay(progress=progress, trim=False)
+                elif self.legacy_path and os.path.exists(self.legacy_path):
+                    for record in self._legacy_records():
+                        self._apply(record)
+                return
+            with self._file_lock:
+                if not os.path.exists(self.path) and self.legacy_path and os.path.exists(self.legacy_path):
+                    self._import_legacy()
+            if os.path.exists(self.path):
+                # a save that's half written right now gets picked up below
+                self._replay(progress=progress, trim=False)
+            with self._file_lock:
+                if os.path.exists(self.path):
+                    if _file_id(os.stat(self.path)) == self._file_id:
+                        self._replay(start=self._offset)
+                    else:
+                        # someone swapped in a compacted copy while we read
+                        self._reload()
+                self._open()
+
+    def _open(self):
+        self._file = open(self.path, "ab")
+        self._file_id = _file_id(os.fstat(self._file.fileno()))
+
+    def _legacy_records(self):
+        """the old whole-list history.json as journal records"""
+        with open(self.legacy_path, "r") as f:
+            stuff_from_file = json.load(f)
+        for number, entry in enumerate(stuff_from_file, 1):
+            yield {
+                "op": "add", "id": number,
+                "display_text": entry["display_text"],
+                "query_parts": entry["query_parts"],
+            }
+
+    def _import_legacy(self):
+        """turns the old whole-list history.json into a fresh journal"""
+        self._write_whole_file(self.path, [self._encode(record) for record in self._legacy_records()])
+
+    def _replay(self, start=0, progress=None, trim=True):
+        """
+        applies the journal from start on. with trim, a cut off last line gets
+        chopped off the file, so that needs the file lock held.
+        """
+        good_bytes = start
+        with open(self.path, "rb") as f:
+            self._file_id = _file_id(os.fstat(f.fileno()))
+            f.seek(start)
+            for count, raw_line in enumerate(f, 1):
+                if progress is not None and count % self.PROGRESS_EVERY == 0:
+                    progress(len(self._entries))
+                if not raw_line.endswith(b"\n"):
+                    # a save that got cut off half way, just drop it (with the
+                    # lock held nobody can be half way through one)
+                    break
+                good_bytes += len(raw_line)
+                try:
+                    record = json.loads(raw_line)
+                except ValueError:
+                    self._dead += 1
+                    continue
+                self._apply(record)
+            if trim and good_bytes != f.seek(0, os.SEEK_END):
+                with open(self.path, "r+b") as cut:
+                    cut.truncate(good_bytes)
+        self._offset = good_bytes
+
+    @PROFILER.timed("store.catch_up")
+    def _catch_up(self):
+        """
+        reads anything other processes added to the journal since we last
+        looked. if one of them compacted it there's a whole new file, so that
+        gets read and just the difference is applied. needs both locks held.
+        """
+        if self._file is None:
+            return
+        try:
+            on_disk = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        if _file_id(on_disk) == self._file_id and on_disk.st_size == self._offset:
+            return
+
+        def note(action, entry_id, entry):
+            self._unsynced.append((action, entry_id))
+        self._listeners.append(note)
+        try:
+            if _file_id(on_disk) == self._file_id and on_disk.st_size > self._offset:
+                self._replay(start=self._offset)
+            else:
+                self._reload()
+                self._file.close()
+                self._open()
+        finally:
+            self._listeners.remove(note)
+
+    def _reload(self):
+        fresh = HistoryStore(self.path)
+        fresh._replay()
+        gone = [entry_id for entry_id in self._entries if entry_id not in fresh._entries]
+        if gone:
+            self._apply({"op": "del", "ids": gone})
+        for entry_id, entry in fresh._entries.items():
+            if entry_id not in self._entries:
+                self._put(entry_id, entry)
+        self._next_id = max(self._next_id, fresh._next_id)
+        self._dead = fresh._dead
+        self._offset = fresh._offset
+        self._file_id = fresh._file_id
+
+    def sync(self):
+        """
+        catches up with changes other processes made to the journal, and gives
+        back what changed since the last sync() as ("add" or "del", id) pairs
+        """
+        if self.read_only:
+            return []
+        with self._lock, self._file_lock:
+            self._catch_up()
+            changes = self._unsynced
+            self._unsynced = []
+        return changes
+
+    def _apply(self, record):
+        """applies one journal record to the in-memory entries"""
+        if record.get("op") == "add":
+            self._apply_add(record)
+        elif record.get("op") == "add_many":
+            for one in record["entries"]:
+                self._apply_add(one)
+        elif record.get("op") == "del":
+            for entry_id in record["ids"]:
+                entry = self._entries.pop(entry_id, None)
+                if entry is not None:
+                    self._forget_query(hash(normalize_query(entry.display_text)), entry_id)
+                    for listener in self._listeners:
+                        listener("del", entry_id, entry)
+                    # the add line and the del line are both dead now
+                    self._dead += 2
+                else:
+                    self._dead += 1
+        elif record.get("op") == "next_id":
+            # left by compact() so ids of deleted entries don't get used again
+            self._next_id = max(self._next_id, record["id"])
+
+    def _apply_add(self, record):
+        display_text = record["display_text"]
+        self._put(record["id"], HistoryRecord(display_text, record["query_parts"]), display_text)
+
+    def _forget_query(self, key, entry_id):
+        ids = self._by_query.get(key)
+        if ids == entry_id:
+            del self._by_query[key]
+        elif isinstance(ids, set):
+            ids.discard(entry_id)
+            if len(ids) == 1:
+                self._by_query[key] = ids.pop()
+
+    def _put(self, entry_id, entry, display_text=None):
+        """files an entry away; pass its text if it's handy, so it isn't compiled again"""
+        self._entries[entry_id] = entry
+        if display_text is None:
+            display_text = entry.display_text
+        key = hash(normalize_query(display_text))
+        ids = self._by_query.get(key)
+        if ids is None or ids == entry_id:
+            self._by_query[key] = entry_id
+        elif isinstance(ids, set):
+            ids.add(entry_id)
+        else:
+            self._by_query[key] = {ids, entry_id}
+        self._next_id = max(self._next_id, entry_id + 1)
+        for listener in self._listeners:
+            listener("add", entry_id, entry)
+
+    @staticmethod
+    def _encode(record):
+        return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+    @PROFILER.timed("store.append")
+    def _append(self, record):
+        """writes one record, needs both locks held and _catch_up() done"""
+        if self._file is None:
+            raise IOError("the history file isn't open")
+        line = self._encode(record)
+        self._file.write(line)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._offset += len(line)
+
+    def _check_writable(self):
+        # before taking the file lock, which would make the lock file
+        if self.read_only:
+            raise IOError("the history was opened read only")
+
+    def add(self, display_text, query_parts):
+        """saves one query and gives back its id"""
+        self._check_writable()
+        with self._lock, self._file_lock:
+            self._catch_up()
+            entry_id = self._next_id
+            record = {
+                "op": "add", "id": entry_id,
+                "display_text": display_text, "query_parts": query_parts,
+            }
+            self._append(record)
+            self._apply(record)
+            return entry_id
+
+    def add_many(self, entries):
+        """
+        saves a list of (display_text, query_parts) in one journal record, so
+        either all of them make it to disk or none do. gives back their ids.
+        """
+        self._check_writable()
+        with self._lock, self._file_lock:
+            if not entries:
+                return []
+            self._catch_up()
+            first_id = self._next_id
+            record = {"op": "add_many", "entries": [
+                {"id": first_id + number, "display_text": display_text, "query_parts": query_parts}
+                for number, (display_text, query_parts) in enumerate(entries)
+            ]}
+            self._append(record)
+            self._apply(record)
+            return list(range(first_id, first_id + len(entries)))
+
+    def delete(self, ids):
+        """deletes a bunch of entries with one journal record"""
+        self._check_writable()
+        with self._lock, self._file_lock:
+            self._catch_up()
+            ids = [entry_id for entry_id in ids if entry_id in self._entries]
+            if not ids:
+                return
+            record = {"op": "del", "ids": ids}
+            self._append(record)
+            self._apply(record)
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self._dead >= self.COMPACT_AFTER and self._dead > len(self._entries):
+            if self._compactor is None or not self._compactor.is_alive():
+                self._compactor = threading.Thread(target=self.compact, daemon=True)
+                self._compactor.start()
+
+    @PROFILER.timed("store.compact")
+    def compact(self):
+        """
+        rewrites the journal with just the live entries, then swaps it in.
+        the slow part runs without the locks, and whatever got written while
+        it ran (by us or anyone else) is copied onto the end before the swap.
+        this runs on its own thread, so it never applies anyone else's records
+        itself (that would call the listeners from here); what they wrote gets
+        copied over as raw bytes and sync() or the next save picks it up.
+        """
+        with self._lock:
+            if self._compacting or self._file is None:
+                return
+            self._compacting = True
+            # everything up to _offset is in _entries, so that's the snapshot
+            snapshot = list(self._entries.items())
+            next_id = self._next_id
+            start = self._offset
+            started_on = self._file_id
+        # other processes might be compacting too, so the temp name is ours alone
+        temp_path = f"{self.path}.{os.getpid()}.compact"
+        try:
+            header = [self._encode({"op": "next_id", "id": next_id})]
+            header.extend(self._encode({
+                "op": "add", "id": entry_id,
+                "display_text": entry.display_text,
+                "query_parts": entry.query_parts,
+            }) for entry_id, entry in snapshot)
+            header_size = sum(map(len, header))
+            with open(temp_path, "wb") as f:
+                f.writelines(header)
+                with self._lock, self._file_lock:
+                    if self._file_id != started_on or _file_id(os.stat(self.path)) != started_on:
+                        # someone else compacted it while we were busy
+                        return
+                    with open(self.path, "rb") as journal:
+                        journal.seek(start)
+                        written_since = journal.read()
+                    # only whole lines, a cut off one gets dropped at the next catch up anyway
+                    written_since = written_since[:written_since.rfind(b"\n") + 1]
+                    f.write(written_since)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    f.close()
+                    try:
+                        os.replace(temp_path, self.path)
+                    except PermissionError:
+                        # windows won't swap a file another process has open,
+                        # so leave the journal as it is and try again later
+                        return
+                    self._file.close()
+                    self._open()
+                    # the same place in the new file, so catching up carries on from there
+                    self._offset = header_size + self._offset - start
+                    self._dead = written_since.count(b'"op":"del"')
+        finally:
+            with self._lock:
+                self._compacting = False
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _write_whole_file(self, path, lines):
+        """writes to a temp file and swaps it in, so a crash can't leave half a file"""
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+    def close(self):
+        """waits for any compaction to finish and closes the journal"""
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def read_dorks(lines):
+    """
+    turns raw dork strings (one per line) into (display_text, query_parts),
+    skipping blanks and # comments. lines the builder boxes can't say are kept
+    as written (see dork_parser.dork_entry), and a line with nothing to search
+    for comes out as None so it can be counted. doesn't touch the history, so
+    it's fine to run on another thread.
+    """
+    from dork_parser import dork_entry
+
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield dork_entry(line)
+
+
+def add_dorks(store, entries):
+    """
+    saves the (display_text, query_parts) pairs that aren't in the history yet
+    (or earlier in entries) as one add_many record.
+    gives back (added, skipped duplicates).
+    """
+    batch = []
+    in_batch = set()
+    skipped = 0
+    for display_text, query_parts in entries:
+        key = normalize_query(display_text)
+        if key in in_batch or store.find(display_text) is not None:
+            skipped += 1
+            continue
+        batch.append((display_text, query_parts))
+        in_batch.add(key)
+    added = len(store.add_many(batch)) if batch else 0
+    return added, skipped
+
+
+def import_dorks(store, lines, batch_size=10000):
+    """
+    reads raw dork strings (one per line) into the history with read_dorks,
+    skipping anything already saved. every batch_size lines go in as one
+    add_many record. gives back (added, skipped duplicates, unparseable).
+    """
+    added = skipped = unparseable = 0
+    batch = []
+    for entry in read_dorks(lines):
+        if entry is None:
+            unparseable += 1
+            continue
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            counts = add_dorks(store, batch)
+            added += counts[0]
+            skipped += counts[1]
+            batch = []
+    if batch:
+        counts = add_dorks(store, batch)
+        added += counts[0]
+        skipped += counts[1]
+    return added, skipped, unparseable
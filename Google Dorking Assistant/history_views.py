@@ -0,0 +1,448 @@
+"""
+qt models for showing the history. the list view only asks for the rows it's
+actually drawing and the tree only makes rows for groups you open, so a huge
+history doesn't mean a huge pile of widgets.
+"""
+import bisect
+import itertools
+import os
+import threading
+
+from PyQt6.QtCore import (
+    Qt, QAbstractItemModel, QAbstractListModel, QModelIndex, QPersistentModelIndex, QThread, pyqtSignal
+)
+
+# the item data role that holds a row's history entry id
+HISTORY_ID_ROLE = Qt.ItemDataRole.UserRole + 1
+
+
+class HistoryListModel(QAbstractListModel):
+    """a list model over a HistoryStore that shows just the ids it's given"""
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self._ids = []
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._ids)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._ids):
+            return None
+        entry_id = self._ids[index.row()]
+        if role == HISTORY_ID_ROLE:
+            return entry_id
+        entry = self.store.get(entry_id)
+        if entry is None:
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return entry["display_text"]
+        if role == Qt.ItemDataRole.UserRole:
+            return entry["query_parts"]
+        return None
+
+    def entry_id(self, index):
+        return self._ids[index.row()]
+
+    def set_ids(self, ids):
+        """swaps in a whole new list of ids to show"""
+        self.beginResetModel()
+        self._ids = list(ids)
+        self.endResetModel()
+
+    def append_id(self, entry_id):
+        row = len(self._ids)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._ids.append(entry_id)
+        self.endInsertRows()
+
+    def remove_ids(self, entry_ids):
+        """takes some ids out, one block of neighbouring rows at a time"""
+        gone = set(entry_ids)
+        rows = [row for row, entry_id in enumerate(self._ids) if entry_id in gone]
+        # go from the bottom up so the row numbers stay right
+        while rows:
+            last = first = rows.pop()
+            while rows and rows[-1] == first - 1:
+                first = rows.pop()
+            self.beginRemoveRows(QModelIndex(), first, last)
+            del self._ids[first:last + 1]
+            self.endRemoveRows()
+
+
+class _Group:
+    """a site or subgroup row in the tree, with whatever children got fetched so far"""
+    __slots__ = ("key", "parent", "row", "level", "children", "by_key", "removed", "complete")
+
+    def __init__(self, key, parent, row):
+        self.key = key
+        self.parent = parent
+        self.row = row
+        self.level = 0 if parent is None else parent.level + 1
+        # child groups, or entry ids under a subgroup, in the order they were fetched
+        self.children = []
+        # key -> child group. under a subgroup it's entry id -> the slot it got
+        # when it was added, and its row is that slot less the removed slots
+        # before it, so big subgroups don't need renumbering or searching
+        self.by_key = {}
+        self.removed = []
+        # True once every child has been fetched, so new ones can just go on the end
+        self.complete = False
+
+
+class HistoryTreeModel(QAbstractItemModel):
+    """
+    the history grouped by site, then by filetype or operator, then the saved
+    queries. children only get made when their parent is expanded, and then
+    FETCH_BATCH at a time, so a huge history never turns into a huge pile of
+    rows. refresh() applies saves and deletes to just the rows they touch.
+    """
+    FETCH_BATCH = 500
+    # past this many changes at once it's quicker to start the tree over
+    RESET_AFTER = 5000
+
+    def __init__(self, groups, parent=None):
+        super().__init__(parent)
+        self.groups = groups
+        self.store = groups.store
+        self._root = _Group(None, None, 0)
+        self._ready = False
+        self._changing = False
+
+    def reset(self):
+        """throws away every fetched row and starts again from the groups"""
+        self.beginResetModel()
+        self.groups.start_recording()
+        self._root = _Group(None, None, 0)
+        self._root.complete = not self.groups.sites
+        self._ready = True
+        self.endResetModel()
+
+    def _child_keys(self, group):
+        if group.level == 0:
+            return self.groups.sites
+        if group.level == 1:
+            return self.groups.subgroups(group.key)
+        return self.groups.ids(group.parent.key, group.key)
+
+    def _item(self, index):
+        """the _Group or entry id behind an index (the root for an invalid one)"""
+        if not index.isValid():
+            return self._root
+        return index.internalPointer().children[index.row()]
+
+    def _index_of(self, group):
+        if group.parent is None:
+            return QModelIndex()
+        return self.createIndex(group.row, 0, group.parent)
+
+    def index(self, row, column, parent=QModelIndex()):
+        group = self._item(parent)
+        if column != 0 or not isinstance(group, _Group) or not 0 <= row < len(group.children):
+            return QModelIndex()
+        # every index points at its parent group, the row says which child it is
+        return self.createIndex(row, 0, group)
+
+    def parent(self, index=None):
+        if index is None:
+            return super().parent()
+        if not index.isValid():
+            return QModelIndex()
+        return self._index_of(index.internalPointer())
+
+    def rowCount(self, parent=QModelIndex()):
+        if not self._ready or parent.column() > 0:
+            return 0
+        item = self._item(parent)
+        return len(item.children) if isinstance(item, _Group) else 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not self._ready:
+            return False
+        item = self._item(parent)
+        return isinstance(item, _Group) and bool(item.children or self._child_keys(item))
+
+    def canFetchMore(self, parent):
+        if not self._ready or self._changing:
+            return False
+        item = self._item(parent)
+        return isinstance(item, _Group) and len(item.children) < len(self._child_keys(item))
+
+    def fetchMore(self, parent):
+        if not self._ready or self._changing:
+            return
+        # what's fetched has to match the groups before we carry on from it
+        parent = QPersistentModelIndex(parent)
+        self.refresh()
+        if not parent.isValid() and parent != QPersistentModelIndex():
+            return
+        parent = QModelIndex(parent)
+        group = self._item(parent)
+        if not isinstance(group, _Group):
+            return
+        start = len(group.children)
+        keys = list(itertools.islice(self._child_keys(group), start, start + self.FETCH_BATCH))
+        if keys:
+            # views can ask to fetch while they hear about the insert, not now though
+            self._changing = True
+            try:
+                self.beginInsertRows(parent, start, start + len(keys) - 1)
+                for key in keys:
+                    self._add_child(group, key)
+                self.endInsertRows()
+            finally:
+                self._changing = False
+        group.complete = len(group.children) >= len(self._child_keys(group))
+
+    def _add_child(self, group, key):
+        if group.level < 2:
+            child = _Group(key, group, len(group.children))
+            group.by_key[key] = child
+            group.children.append(child)
+        else:
+            group.by_key[key] = len(group.children) + len(group.removed)
+            group.children.append(key)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        item = self._item(index)
+        if isinstance(item, _Group):
+            if role == Qt.ItemDataRole.DisplayRole:
+                if item.level == 1:
+                    count = self.groups.counts.get(item.key, 0)
+                else:
+                    count = len(self.groups.ids(item.parent.key, item.key))
+                return f"{item.key}  ({count})"
+            return None
+        if role == HISTORY_ID_ROLE:
+            return item
+        entry = self.store.get(item)
+        if entry is None:
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.ToolTipRole):
+            return entry["display_text"]
+        if role == Qt.ItemDataRole.UserRole:
+            return entry["query_parts"]
+        return None
+
+    def entry_id(self, index):
+        """the history id of a query row, None for a group row"""
+        item = self._item(index)
+        return None if isinstance(item, _Group) else item
+
+    def refresh(self):
+        """catches up with whatever got saved or deleted since last time"""
+        if not self._ready:
+            return
+        changes = self.groups.take_changes()
+        if len(changes) > self.RESET_AFTER:
+            self.reset()
+            return
+        self._changing = True
+        try:
+            for action, entry_id, site, subgroup, emptied in changes:
+                if action == "add":
+                    self._added(entry_id, site, subgroup)
+                else:
+                    self._removed(entry_id, site, subgroup, emptied)
+        finally:
+            self._changing = False
+
+    def _append_row(self, group, key):
+        if key in group.by_key:
+            # a fetchMore already got it
+            return
+        row = len(group.children)
+        self.beginInsertRows(self._index_of(group), row, row)
+        self._add_child(group, key)
+        self.endInsertRows()
+
+    def _remove_row(self, group, row):
+        self.beginRemoveRows(self._index_of(group), row, row)
+        child = group.children.pop(row)
+        if isinstance(child, _Group):
+            del group.by_key[child.key]
+            for later in group.children[row:]:
+                later.row -= 1
+        self.endRemoveRows()
+
+    def _remove_entry_row(self, group, entry_id):
+        """takes a query row out of a subgroup, if it's been fetched"""
+        slot = group.by_key.get(entry_id)
+        if slot is None:
+            return
+        self._remove_row(group, slot - bisect.bisect_left(group.removed, slot))
+        del group.by_key[entry_id]
+        bisect.insort(group.removed, slot)
+
+    def _count_changed(self, group):
+        index = self._index_of(group)
+        self.dataChanged.emit(index, index)
+
+    def _added(self, entry_id, site, subgroup):
+        # new rows only go in where everything before them is already
+        # fetched, anywhere else they'll turn up when that part is fetched
+        site_group = self._root.by_key.get(site)
+        if site_group is None:
+            if self._root.complete:
+                self._append_row(self._root, site)
+            return
+        self._count_changed(site_group)
+        sub_group = site_group.by_key.get(subgroup)
+        if sub_group is None:
+            if site_group.complete:
+                self._append_row(site_group, subgroup)
+            return
+        self._count_changed(sub_group)
+        if sub_group.complete:
+            self._append_row(sub_group, entry_id)
+
+    def _removed(self, entry_id, site, subgroup, emptied):
+        site_group = self._root.by_key.get(site)
+        if site_group is None:
+            return
+        if emptied == 2:
+            self._remove_row(self._root, site_group.row)
+            return
+        sub_group = site_group.by_key.get(subgroup)
+        if sub_group is not None:
+            if emptied == 1:
+                self._remove_row(site_group, sub_group.row)
+            else:
+                self._remove_entry_row(sub_group, entry_id)
+                self._count_changed(sub_group)
+        self._count_changed(site_group)
+
+
+class HistoryExporter(QThread):
+    """runs history_export.export_history in the background"""
+    progress = pyqtSignal(int, int)
+    done = pyqtSignal(int)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, store, path, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.path = path
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        from history_export import ExportCancelled, export_history
+        try:
+            count = export_history(self.store, self.path, progress=self.progress.emit,
+                                   cancelled=lambda: self._cancelled)
+        except ExportCancelled:
+            self.cancelled.emit()
+        except (IOError, OSError, ValueError) as e:
+            self.failed.emit(f"Could not save file: {e}")
+        else:
+            self.done.emit(count)
+
+
+class DorkImporter(QThread):
+    """
+    reads a file of raw dorks in the background with history_store.read_dorks.
+    the parsed entries come back a batch at a time through parsed(list) and
+    get saved on the gui thread (history_store.add_dorks), since the search
+    index and groups hang off the store and aren't safe to change from here.
+    call batch_saved() after each one: reading is quicker than saving, and
+    without waiting a pile of batches would queue up and freeze the window
+    while they all get saved in one go. done(unparseable lines) comes after
+    the last batch.
+    """
+    BATCH = 100
+    # how far through the file, in percent
+    progress = pyqtSignal(int)
+    parsed = pyqtSignal(list)
+    done = pyqtSignal(int)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self._cancelled = False
+        # only one batch waits for the gui at a time, the next one gets read
+        # while it's being saved
+        self._room = threading.Semaphore(1)
+
+    def cancel(self):
+        self._cancelled = True
+
+    def batch_saved(self):
+        self._room.release()
+
+    def _hand_over(self, batch):
+        """sends a batch once the gui has room for it, False if we got cancelled meanwhile"""
+        while not self._room.acquire(timeout=0.05):
+            if self._cancelled:
+                return False
+        self.parsed.emit(batch)
+        return True
+
+    def _lines(self, f, size):
+        """the file's lines, with the progress going up as they're read"""
+        read = 0
+        percent = 0
+        for raw in f:
+            if self._cancelled:
+                return
+            read += len(raw)
+            if size and read * 100 // size > percent:
+                percent = read * 100 // size
+                self.progress.emit(percent)
+            yield raw.decode("utf-8", errors="replace")
+
+    def run(self):
+        from history_store import read_dorks
+        unparseable = 0
+        batch = []
+        try:
+            size = os.path.getsize(self.path)
+            with open(self.path, "rb") as f:
+                for entry in read_dorks(self._lines(f, size)):
+                    if entry is None:
+                        unparseable += 1
+                        continue
+                    batch.append(entry)
+                    if len(batch) >= self.BATCH:
+                        if not self._hand_over(batch):
+                            break
+                        batch = []
+        except (IOError, OSError) as e:
+            self.failed.emit(f"Could not import dorks: {e}")
+            return
+        if self._cancelled:
+            self.cancelled.emit()
+            return
+        if batch and not self._hand_over(batch):
+            self.cancelled.emit()
+            return
+        self.done.emit(unparseable)
+
+
+class HistoryLoader(QThread):
+    """reads the history journal in the background so the window shows up straight away"""
+    progress = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+
+    def run(self):
+        try:
+            self.store.load(progress=self.progress.emit)
+        except (IOError, OSError, ValueError, KeyError) as e:
+            self.failed.emit(str(e))
@@ -0,0 +1,124 @@
+"""
+an on-disk cache of search results, so re-running a dork campaign only goes
+to the network for queries we haven't seen lately. entries are keyed by the
+canonical form of the query (see dork_parser.canonical_query), expire after a
+ttl, and the least recently used ones get thrown out once the cache is too big.
+"""
+import json
+import sqlite3
+import threading
+import time
+
+from dork_parser import canonical_query
+
+# a week
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ResultCache:
+    """a sqlite file of canonical query -> result, with ttl and lru eviction"""
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                result TEXT NOT NULL,
+                stored REAL NOT NULL,
+                used REAL NOT NULL,
+                size INTEGER NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_by_use ON results (used)")
+        self._db.commit()
+        self._total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def get(self, query):
+        """gives back the cached result for a query, or None if there's no fresh one"""
+        key = canonical_query(query)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT result, stored, size FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            result, stored, size = row
+            if now - stored > self.ttl:
+                self._db.execute("DELETE FROM results WHERE key = ?", (key,))
+                self._db.commit()
+                self._total -= size
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE results SET used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            self.hits += 1
+        return json.loads(result)
+
+    def put(self, query, result):
+        """stores a result (anything json can handle) for a query"""
+        key = canonical_query(query)
+        text = json.dumps(result)
+        size = len(text) + len(key)
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, query, result, stored, used, size) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (key, query, text, now, now, size))
+            self._total += size - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        """drops the least recently used entries until we're down to 90% of the limit"""
+        goal = self.max_bytes * 0.9
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM results ORDER BY used"):
+            if self._total <= goal:
+                break
+            doomed.append((key,))
+            self._total -= size
+        self._db.executemany("DELETE FROM results WHERE key = ?", doomed)
+        self.evicted += len(doomed)
+
+    def purge_expired(self):
+        """deletes everything past its ttl, gives back how many went"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            gone = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results WHERE stored < ?", (cutoff,)).fetchone()
+            self._db.execute("DELETE FROM results WHERE stored < ?", (cutoff,))
+            self._db.commit()
+            self._total -= gone[1]
+            self.expired += gone[0]
+        return gone[0]
+
+    def stats(self):
+        looked_up = self.hits + self.misses
+        return {
+            "hits": self.hits, "misses": self.misses, "expired": self.expired,
+            "evicted": self.evicted, "bytes": self._total,
+            "hit_rate": self.hits / looked_up if looked_up else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,84 @@
+"""
+checks that importing raw dorks never changes what they mean. run with
+python -m pytest from this folder.
+"""
+import random
+
+import pytest
+
+from dork_compiler import FIELD_ORDER, put_the_query_together
+from dork_parser import canonical_query, dork_entry, parse_dork
+from history_store import HistoryStore, import_dorks
+
+# the sort of things people type into the builder boxes
+BOX_BITS = ["admin", "login.php", "index of", "example.com", "pdf", "root", '"exact words"',
+            "a, b", " spaced ", "x-y", '"a, b"', "c d, e"]
+
+
+def random_parts(rng):
+    parts = dict.fromkeys(FIELD_ORDER, "")
+    for key in FIELD_ORDER:
+        if rng.random() < 0.4:
+            parts[key] = ", ".join(rng.choice(BOX_BITS) for _ in range(rng.randint(1, 3)))
+    return parts
+
+
+def test_builder_dorks_come_back_exactly():
+    rng = random.Random(14)
+    for _ in range(20000):
+        query = put_the_query_together(random_parts(rng))
+        if not query:
+            continue
+        assert put_the_query_together(parse_dork(query)) == query
+        assert dork_entry(query)[0] == query
+
+
+@pytest.mark.parametrize("line", [
+    "(admin OR root) password",
+    "ext:pdf passwords",
+    '"a" "b c"',
+    "index of",
+    "a OR b site:example.com",
+    "-(a b) secret",
+])
+def test_lines_the_boxes_cant_say_are_kept_as_written(line):
+    assert dork_entry(line)[0] == line
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("-(a OR b) secret", "secret -a -b"),
+    ('intitle:"a, b"', 'intitle:"a, b"'),
+    ("site:a,b", 'site:"a,b"'),
+    ('intitle:"index of" passwd', 'passwd intitle:"index of"'),
+])
+def test_lines_the_boxes_can_say_mean_the_same(line, expected):
+    display_text, query_parts = dork_entry(line)
+    assert display_text == expected
+    assert canonical_query(put_the_query_together(query_parts)) == canonical_query(line)
+
+
+def test_excluded_group_is_not_a_required_one():
+    parts = parse_dork("-(a OR b)")
+    assert parts["exclude_keywords"] == "a, b"
+    assert parts["keywords"] == ""
+
+
+@pytest.mark.parametrize("line", ["()", "OR", "-()"])
+def test_nothing_to_search_for(line):
+    assert dork_entry(line) is None
+
+
+def test_import_keeps_lines_and_counts_what_it_skipped(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.jsonl"))
+    store.load()
+    lines = ["(admin OR root) password", "-(a OR b) secret", "  ", "# a comment",
+             "()", "(admin OR root) password", 'intitle:"a, b"']
+    assert import_dorks(store, lines) == (3, 1, 1)
+    texts = sorted(entry["display_text"] for _, entry in store.items())
+    assert texts == sorted(["(admin OR root) password", "secret -a -b", 'intitle:"a, b"'])
+    store.close()
+
+
+@pytest.mark.parametrize("query", ["a OR b", "(a OR b)", "((b OR a))", '("a" OR b)'])
+def test_brackets_around_the_whole_query_dont_count(query):
+    assert canonical_query(query) == "a OR b"
@@ -0,0 +1,156 @@
+"""
+checks for the history journal: what gets kept, what gets found, and what
+other stores sharing the file see. run with python -m pytest from this folder.
+"""
+import json
+
+import pytest
+
+from history_store import HistoryStore
+
+
+def write_records(path, records):
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def add_record(entry_id, text):
+    return {"op": "add", "id": entry_id, "display_text": text, "query_parts": {"keywords": text}}
+
+
+def open_store(path):
+    store = HistoryStore(str(path))
+    store.load()
+    return store
+
+
+def test_case_variants_from_old_versions_stay_findable(tmp_path):
+    path = tmp_path / "history.jsonl"
+    write_records(path, [add_record(1, "Admin"), add_record(2, "admin")])
+    store = open_store(path)
+    assert store.find("ADMIN") == 1
+    store.delete([1])
+    assert store.find("ADMIN") == 2
+    store.delete([2])
+    assert store.find("ADMIN") is None
+    store.close()
+
+
+def test_a_cut_off_last_line_gets_trimmed(tmp_path):
+    path = tmp_path / "history.jsonl"
+    write_records(path, [add_record(1, "admin"), add_record(2, "login")])
+    whole = path.stat().st_size
+    with open(path, "ab") as f:
+        f.write(b'{"op":"add","id":3,"display_text":"pass')
+    store = open_store(path)
+    assert store.ids() == [1, 2]
+    assert path.stat().st_size == whole
+    # the next save starts on a fresh line instead of gluing onto the cut off one
+    entry_id = store.add("password", {"keywords": "password"})
+    store.close()
+    store = open_store(path)
+    assert store.ids() == [1, 2, entry_id]
+    store.close()
+
+
+def test_old_history_json_gets_brought_over(tmp_path):
+    path = tmp_path / "history.jsonl"
+    legacy_path = tmp_path / "history.json"
+    legacy_path.write_text(json.dumps([
+        {"display_text": "admin", "query_parts": {"keywords": "admin"}},
+        {"display_text": "site:example.com", "query_parts": {"site": "example.com"}},
+    ], indent=4))
+    store = HistoryStore(str(path), legacy_path=str(legacy_path))
+    store.load()
+    assert [entry["display_text"] for _, entry in store.items()] == ["admin", "site:example.com"]
+    assert store.find("site:example.com") == 2
+    store.close()
+    assert path.exists() and legacy_path.exists()
+    # from then on the journal is what counts
+    legacy_path.write_text("[]")
+    store = HistoryStore(str(path), legacy_path=str(legacy_path))
+    store.load()
+    assert len(store) == 2
+    store.close()
+
+
+def test_compacting_keeps_the_live_entries_and_never_reuses_ids(tmp_path):
+    path = tmp_path / "history.jsonl"
+    store = open_store(path)
+    ids = store.add_many([(f"query {number}", {"keywords": f"query {number}"}) for number in range(10)])
+    store.delete(ids[5:])
+    store.compact()
+    # the next_id line and the five that are left
+    assert len(path.read_bytes().splitlines()) == 6
+    entry_id = store.add("after", {"keywords": "after"})
+    assert entry_id > ids[-1]
+    store.close()
+    store = open_store(path)
+    assert store.ids() == ids[:5] + [entry_id]
+    store.delete([entry_id])
+    store.compact()
+    store.close()
+    # the newest id is gone from the file, it still mustn't come back
+    store = open_store(path)
+    assert store.add("again", {"keywords": "again"}) > entry_id
+    store.close()
+
+
+def test_two_stores_on_one_journal_see_each_others_changes(tmp_path):
+    path = tmp_path / "history.jsonl"
+    first = open_store(path)
+    second = open_store(path)
+    entry_id = first.add("admin", {"keywords": "admin"})
+    assert second.sync() == [("add", entry_id)]
+    assert second.get(entry_id)["display_text"] == "admin"
+    # saving catches up first, so the ids don't clash
+    other_id = second.add("login", {"keywords": "login"})
+    assert other_id != entry_id
+    second.delete([entry_id])
+    assert first.sync() == [("add", other_id), ("del", entry_id)]
+    assert first.ids() == second.ids() == [other_id]
+    assert first.sync() == []
+    first.close()
+    second.close()
+
+
+def test_a_compaction_by_one_store_is_picked_up_by_another(tmp_path):
+    path = tmp_path / "history.jsonl"
+    first = open_store(path)
+    second = open_store(path)
+    # this one doesn't look until after the swap, so it has to diff the whole file
+    third = open_store(path)
+    ids = first.add_many([(f"query {number}", {"keywords": f"query {number}"}) for number in range(10)])
+    second.sync()
+    first.delete(ids[3:])
+    second.sync()
+    first.compact()
+    # written after the swap, so it's only in the new file
+    late_id = first.add("late", {"keywords": "late"})
+    assert second.sync() == [("add", late_id)]
+    assert second.ids() == ids[:3] + [late_id]
+    assert third.sync() == [("add", entry_id) for entry_id in ids[:3] + [late_id]]
+    new_id = second.add("newer", {"keywords": "newer"})
+    assert new_id > late_id
+    assert first.sync() == [("add", new_id)]
+    assert third.add("newest", {"keywords": "newest"}) > new_id
+    for store in (first, second, third):
+        store.close()
+
+
+def test_a_read_only_store_leaves_the_files_alone(tmp_path):
+    path = tmp_path / "history.jsonl"
+    store = HistoryStore(str(path), read_only=True)
+    store.load()
+    assert len(store) == 0
+    store.close()
+    legacy_path = tmp_path / "history.json"
+    legacy_path.write_text(json.dumps([{"display_text": "admin", "query_parts": {"keywords": "admin"}}]))
+    store = HistoryStore(str(path), legacy_path=str(legacy_path), read_only=True)
+    store.load()
+    assert store.find("admin") == 1
+    with pytest.raises(IOError):
+        store.add("login", {"keywords": "login"})
+    store.close()
+    assert sorted(child.name for child in tmp_path.iterdir()) == ["history.json"]